@@ -0,0 +1,421 @@
+"""视频解析服务的 asyncio (ASGI) 运行模式
+
+路由和 JSON 格式与 video_parser.create_app 保持一致, 上游探测使用
+httpx.AsyncClient 非阻塞完成, 单个进程即可同时挂起大量解析请求.
+
+启动方式:
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+    gunicorn asgi_app:app -k uvicorn.workers.UvicornWorker -w 2
+
+与同步模式的差异:
+    - /stats 和 /metrics 的连接池统计来自 httpx 客户端, 只有 requests、
+      connections、reused、hosts、in_flight; httpx 不按主机划分会话也不缓存 DNS,
+      没有 session_*/dns_* 计数.
+    - 同一视频的请求只在进程内合并, 不支持 SINGLE_FLIGHT_LOCK_DIR 的跨 worker 合并.
+"""
+import asyncio
+import json
+import mimetypes
+import os
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+from platforms import canonical_key
+from result_cache import MISS
+from single_flight import SingleFlightTimeout
+from video_parser import (
+    Config, HEADERS, logger, health_board, result_cache,
+    is_valid_url, match_platform, preferred_api, ranked_apis, build_result, for_request,
+    cached_result, line_open,
+    breaker_verdict, next_hedge_at, PROBE_OK, PROBE_REJECTED, PROBE_FAILED,
+    metrics, REQUEST_LATENCY, REQUESTS_IN_FLIGHT, PROBE_LATENCY, CACHE_RESULTS,
+    format_server_timing, set_pool_stats
+)
+from metrics import Registry
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'POST, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type'
+}
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'public')
+
+
+class AsyncResolver:
+    """异步解析器: 结果缓存、请求合并、健康排名和并发竞速探测
+
+    结果缓存的 sqlite 二级缓存和健康记分板的读写都在线程池中执行, 不阻塞事件循环.
+    """
+
+    def __init__(self):
+        self.client = None
+        self._calls = {}
+        self._hosts = set()
+        self.counters = {'requests': 0, 'connections': 0, 'in_flight': 0}
+
+    async def startup(self):
+        self.client = httpx.AsyncClient(
+            headers=HEADERS,
+            follow_redirects=True,
+            timeout=httpx.Timeout(Config.PROBE_TIMEOUT, connect=Config.CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=None,
+                max_keepalive_connections=Config.HTTP_POOL_SIZE * len(health_board.apis)
+            )
+        )
+
+    async def shutdown(self):
+        for call in list(self._calls.values()):
+            call.cancel()
+        if self.client:
+            await self.client.aclose()
+
+    def stats(self):
+        """连接池统计: 请求数, 新建连接数和复用数, 访问过的上游主机数, 在途请求数"""
+        stats = dict(self.counters)
+        stats['reused'] = max(stats['requests'] - stats['connections'], 0)
+        stats['hosts'] = len(self._hosts)
+        return stats
+
+    async def _trace(self, event, info):
+        # httpcore 的 trace 回调, 用于统计新建连接数
+        if event == 'connection.connect_tcp.complete':
+            self.counters['connections'] += 1
+
+    async def cache_get(self, key):
+        loop = asyncio.get_running_loop()
+        # 启用 sqlite 二级缓存时读取会阻塞, 纯内存缓存直接读取
+        if result_cache.path:
+            return await loop.run_in_executor(None, cached_result, key)
+        cached = result_cache.get(key)
+        # 熔断检查在记分板快照过期时会读取 sqlite
+        if cached is not MISS and cached and await loop.run_in_executor(None, line_open, cached):
+            return MISS
+        return cached
+
+    async def cache_set(self, key, value):
+        if result_cache.path:
+            return await asyncio.get_running_loop().run_in_executor(None, result_cache.set, key, value)
+        return result_cache.set(key, value)
+
+    async def resolve(self, url, platform=None):
+        """解析视频地址, 返回 (解析结果, 缓存状态)"""
+        platform = platform or match_platform(url)
+        key = canonical_key(url, platform)
+        cached = await self.cache_get(key)
+        if cached is not MISS:
+            CACHE_RESULTS.inc(status='hit')
+            return for_request(cached, url), 'hit'
+
+        # 同一视频的并发请求只由第一个请求实际解析
+        call = self._calls.get(key)
+        if call is not None:
+            try:
+                result, _ = await asyncio.wait_for(asyncio.shield(call), Config.SINGLE_FLIGHT_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise SingleFlightTimeout(f"等待 {key} 的解析结果超时")
+            CACHE_RESULTS.inc(status='coalesced')
+            return for_request(result, url), 'coalesced'
+
+        # 解析在独立任务中运行, 发起请求被取消 (批量请求提前结束、服务关闭) 时
+        # 其余等待者仍能拿到结果
+        call = self._calls[key] = asyncio.ensure_future(self._resolve_uncached(url, key, platform))
+        call.add_done_callback(lambda task: self._call_done(key, task))
+        result = await asyncio.shield(call)
+        CACHE_RESULTS.inc(status=result[1])
+        return result
+
+    def _call_done(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # 没有等待者时避免 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
+
+    async def _resolve_uncached(self, url, key, platform):
+        loop = asyncio.get_running_loop()
+        # 记分板快照过期时会读取 sqlite
+        api = await loop.run_in_executor(None, preferred_api, platform)
+        if not api:
+            apis = await loop.run_in_executor(None, ranked_apis, platform)
+            api = await self.hedged_probe(url, apis, Config.HEDGE_DELAY, Config.PARSE_DEADLINE)
+        result = build_result(url, api, platform)
+        await self.cache_set(key, result)
+        return result, 'miss'
+
+    async def probe(self, api, url, timeout):
+        """探测单个解析接口, 按 breaker_verdict 在线程池中写入健康记分板"""
+        logger.info(f"尝试使用接口: {api}")
+        self.counters['requests'] += 1
+        self._hosts.add(urlsplit(api).netloc)
+        start = time.monotonic()
+        try:
+            response = await self.client.head(
+                api + url,
+                timeout=httpx.Timeout(timeout, connect=min(Config.CONNECT_TIMEOUT, timeout)),
+                extensions={'trace': self._trace}
+            )
+            outcome = PROBE_OK if response.status_code == 200 else PROBE_REJECTED
+            if outcome != PROBE_OK:
+                logger.warning(f"接口 {api} 返回状态码: {response.status_code}")
+        except httpx.HTTPError as e:
+            outcome = PROBE_FAILED
+            logger.error(f"请求接口 {api} 失败: {str(e)}")
+        except asyncio.CancelledError:
+            # 竞速失败被取消, 不计入健康状态
+            raise
+        elapsed = time.monotonic() - start
+        ok = outcome == PROBE_OK
+        PROBE_LATENCY.observe(elapsed, api=api, result='ok' if ok else 'fail', source='request')
+        verdict = breaker_verdict(outcome, timeout)
+        if verdict is not None:
+            asyncio.get_running_loop().run_in_executor(None, health_board.record, api, verdict, elapsed)
+        return ok
+
+    async def hedged_probe(self, url, apis, hedge_delay, deadline, max_inflight=None):
+        """并发探测解析接口, 返回最先可用的接口
+
+        错峰方式与同步模式一致: 每过 hedge_delay 秒仍没有可用接口, 或有探测失败,
+        才发起下一个, 发起不到 hedge_delay 秒的探测不超过 max_inflight 个; 有接口可用后
+        其余探测立即取消.
+        """
+        max_inflight = max_inflight or Config.HEDGE_MAX_INFLIGHT
+        start = time.monotonic()
+        queue = iter(apis)
+        pending = {}
+        exhausted = False
+        next_at = start
+        try:
+            while True:
+                now = time.monotonic()
+                remaining = deadline - (now - start)
+                if remaining <= 0:
+                    logger.warning(f"解析超时, 已用时 {deadline} 秒")
+                    return None
+                launch_at = next_hedge_at(next_at, [started for _, started in pending.values()],
+                                         now, hedge_delay, max_inflight)
+                if not exhausted and now >= launch_at:
+                    api = next(queue, None)
+                    if api is None:
+                        exhausted = True
+                    else:
+                        probe = self.probe(api, url, min(Config.PROBE_TIMEOUT, remaining))
+                        pending[asyncio.ensure_future(probe)] = (api, now)
+                        next_at = now + hedge_delay
+                    continue
+                if not pending:
+                    return None
+                timeout = remaining if exhausted else min(remaining, launch_at - now)
+                done, _ = await asyncio.wait(set(pending), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    api, _ = pending.pop(future)
+                    if future.result():
+                        return api
+                    # 探测失败, 不再等待错峰间隔
+                    next_at = time.monotonic()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+resolver = AsyncResolver()
+set_pool_stats(resolver.stats)
+_batch_slots = None
+
+
+async def send_json(send, payload, status=200, headers=None):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    await send_response(send, body, status, 'application/json', headers)
+
+
+async def send_response(send, body, status=200, content_type='application/json', headers=None):
+    header_list = [(b'content-type', content_type.encode()), (b'content-length', str(len(body)).encode())]
+    for name, value in (headers or {}).items():
+        header_list.append((name.lower().encode(), value.encode()))
+    await send({'type': 'http.response.start', 'status': status, 'headers': header_list})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def read_json(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    try:
+        return json.loads(b''.join(chunks) or b'null')
+    except ValueError:
+        return None
+
+
+async def parse_video(receive, send):
+    timings = []
+    start = last = time.perf_counter()
+
+    def mark(name):
+        nonlocal last
+        now = time.perf_counter()
+        timings.append((name, now - last))
+        last = now
+
+    try:
+        data = await read_json(receive)
+        if not isinstance(data, dict) or 'url' not in data:
+            return await send_json(send, {'error': '请提供视频URL'}, 400)
+
+        url = data['url']
+        if not url:
+            return await send_json(send, {'error': '请提供视频URL'}, 400)
+
+        # 检查URL格式
+        platform = match_platform(url)
+        if not platform:
+            return await send_json(send, {'error': '不支持的视频平台或无效的URL'}, 400)
+        mark('validate')
+
+        result, cache_status = await resolver.resolve(url, platform)
+        mark('probe')
+        if result:
+            body = json.dumps(dict(result, cache=cache_status), ensure_ascii=False).encode('utf-8')
+            mark('serialize')
+            headers = dict(CORS_HEADERS, **{
+                'Cache-Control': 'no-cache',
+                'Server-Timing': format_server_timing(timings + [('total', time.perf_counter() - start)])
+            })
+            return await send_response(send, body, 200, 'application/json', headers)
+        return await send_json(send, {'error': '视频解析失败，请稍后重试', 'cache': cache_status}, 400)
+
+    except SingleFlightTimeout as e:
+        logger.warning(f"解析超时: {str(e)}")
+        return await send_json(send, {'error': '解析超时，请稍后重试'}, 504)
+
+    except Exception as e:
+        logger.error(f"解析错误: {str(e)}")
+        return await send_json(send, {'error': '服务器处理请求失败，请稍后重试'}, 500)
+
+
+async def parse_batch(receive, send):
+    global _batch_slots
+    if _batch_slots is None:
+        _batch_slots = asyncio.Semaphore(Config.BATCH_MAX_ACTIVE)
+
+    data = await read_json(receive)
+    urls = data.get('urls') if isinstance(data, dict) else None
+    if not urls or not isinstance(urls, list):
+        return await send_json(send, {'error': '请提供视频URL列表'}, 400)
+    if len(urls) > Config.BATCH_MAX_URLS:
+        return await send_json(send, {'error': f'单次最多解析 {Config.BATCH_MAX_URLS} 个URL'}, 400)
+
+    # 先校验全部URL, 任何一个无效则整批拒绝
+    invalid = [i for i, url in enumerate(urls)
+               if not isinstance(url, str) or not url.strip() or not is_valid_url(url)]
+    if invalid:
+        return await send_json(send, {'error': '不支持的视频平台或无效的URL', 'invalid': invalid}, 400)
+
+    if _batch_slots.locked():
+        return await send_json(send, {'error': '批量解析繁忙，请稍后重试'}, 429)
+
+    async with _batch_slots:
+        headers = [(b'content-type', b'application/x-ndjson'), (b'cache-control', b'no-cache')]
+        headers += [(name.lower().encode(), value.encode()) for name, value in CORS_HEADERS.items()]
+        await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+
+        limit = asyncio.Semaphore(Config.BATCH_CONCURRENCY)
+
+        async def record(index, url):
+            async with limit:
+                try:
+                    result, cache_status = await resolver.resolve(url)
+                except SingleFlightTimeout:
+                    return {'index': index, 'input': url, 'error': '解析超时，请稍后重试'}
+                except Exception as e:
+                    logger.error(f"批量解析 {url} 失败: {str(e)}")
+                    return {'index': index, 'input': url, 'error': '服务器处理请求失败，请稍后重试'}
+            if not result:
+                return {'index': index, 'input': url, 'error': '视频解析失败，请稍后重试', 'cache': cache_status}
+            return dict(result, index=index, input=url, cache=cache_status)
+
+        tasks = [asyncio.ensure_future(record(i, url.strip())) for i, url in enumerate(urls)]
+        try:
+            for future in asyncio.as_completed(tasks):
+                line = json.dumps(await future, ensure_ascii=False) + '\n'
+                await send({'type': 'http.response.body', 'body': line.encode('utf-8'), 'more_body': True})
+        finally:
+            for task in tasks:
+                task.cancel()
+        await send({'type': 'http.response.body', 'body': b''})
+
+
+async def serve_static(path, send):
+    name = 'index.html' if path == '/' else path.lstrip('/')
+    full = os.path.normpath(os.path.join(STATIC_DIR, name))
+    if not full.startswith(STATIC_DIR + os.sep) or not os.path.isfile(full):
+        return await send_json(send, {'error': '请求的资源不存在'}, 404)
+    with open(full, 'rb') as f:
+        body = f.read()
+    content_type = mimetypes.guess_type(full)[0] or 'application/octet-stream'
+    await send_response(send, body, 200, content_type)
+
+
+async def app(scope, receive, send):
+    """ASGI 入口"""
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await resolver.startup()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await resolver.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    if scope['type'] != 'http':
+        return
+
+    if resolver.client is None:
+        await resolver.startup()
+
+    path, method = scope['path'], scope['method']
+    if path in ('/parse', '/parse/batch') and method == 'OPTIONS':
+        return await send_response(send, b'', 200, 'text/html; charset=utf-8', CORS_HEADERS)
+
+    route = path if path in ('/', '/parse', '/parse/batch', '/stats', '/metrics') else 'unmatched'
+    status = []
+
+    async def send_with_status(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+        await send(message)
+
+    start = time.perf_counter()
+    resolver.counters['in_flight'] += 1
+    REQUESTS_IN_FLIGHT.inc(route=route)
+    try:
+        if path == '/parse' and method == 'POST':
+            return await parse_video(receive, send_with_status)
+        if path == '/parse/batch' and method == 'POST':
+            return await parse_batch(receive, send_with_status)
+        if path == '/stats' and method == 'GET':
+            return await send_json(send_with_status, {'pool': resolver.stats()})
+        if path == '/metrics' and method == 'GET':
+            # 抓取时会读取健康记分板
+            body = await asyncio.get_running_loop().run_in_executor(None, metrics.render)
+            return await send_response(send_with_status, body.encode('utf-8'), 200, Registry.CONTENT_TYPE)
+        if method in ('GET', 'HEAD'):
+            return await serve_static(path, send_with_status)
+        return await send_json(send_with_status, {'error': '请求的资源不存在'}, 404)
+    finally:
+        resolver.counters['in_flight'] -= 1
+        REQUESTS_IN_FLIGHT.dec(route=route)
+        REQUEST_LATENCY.observe(time.perf_counter() - start, route=route, method=method,
+                                status=status[0] if status else 500)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host=Config.HOST, port=Config.PORT)
@@ -0,0 +1,62 @@
+import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FORMAT = '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
+
+
+class AsyncLogging:
+    """基于队列的异步日志
+
+    请求线程只把日志记录放入内存队列, 由后台线程写入控制台和滚动日志文件.
+    fork 之后在子进程中重建队列和后台线程.
+    """
+
+    def __init__(self, log_file='app.log', max_bytes=10 * 1024 * 1024, backup_count=5,
+                 level=logging.INFO, queue_size=10000):
+        self.handlers = [logging.StreamHandler()]
+        if log_file:
+            self.handlers.append(RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count))
+        for handler in self.handlers:
+            handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        self.level = level
+        self.queue_size = queue_size
+        self.queue_handler = None
+        self.listener = None
+
+    def install(self, logger=None):
+        """把 logger(默认根 logger) 的输出改为经由队列异步写出"""
+        logger = logger or logging.getLogger()
+        self.queue_handler = _DroppingQueueHandler(queue.Queue(self.queue_size))
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        logger.addHandler(self.queue_handler)
+        logger.setLevel(self.level)
+        self._start()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._restart)
+        return self
+
+    def _start(self):
+        self.listener = QueueListener(self.queue_handler.queue, *self.handlers, respect_handler_level=True)
+        self.listener.start()
+
+    def _restart(self):
+        # 父进程的后台线程不会随 fork 复制, 子进程使用新的队列和线程
+        self.queue_handler.queue = queue.Queue(self.queue_size)
+        self._start()
+
+    def stop(self):
+        if self.listener:
+            self.listener.stop()
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """队列满时丢弃日志而不是阻塞请求线程"""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
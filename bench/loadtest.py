@@ -0,0 +1,225 @@
+"""离线压测: 模拟解析线路 + gunicorn + 并发压测
+
+为每个场景在独立进程中启动本地模拟线路, 通过 PARSE_APIS 环境变量把应用指向它们,
+用 gunicorn 启动应用后以固定并发持续请求 /parse, 输出 RPS、p50/p95/p99 和失败率,
+并与 bench/baseline.json 中的基线比较.
+
+用法:
+    python bench/loadtest.py                               # 全部应用和场景
+    python bench/loadtest.py --targets video_parser --scenarios default_dead
+    python bench/loadtest.py --save-baseline               # 更新基线
+    python bench/loadtest.py --env HEALTH_CHECK=1          # 额外的应用环境变量
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from upstream_stub import free_port, spawn_stubs  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# 被测应用: gunicorn 的 worker 参数和应用入口
+TARGETS = {
+    'video_parser': ['-k', 'gthread', 'video_parser:create_app()'],
+    'index': ['-k', 'gthread', 'index:app'],
+    'asgi': ['-k', 'uvicorn.workers.UvicornWorker', 'asgi_app:app'],
+}
+
+# 场景: 各条线路的表现, 第一条为默认线路
+SCENARIOS = {
+    'all_healthy': ['healthy'] * 6,
+    'default_dead': ['dead'] + ['healthy'] * 5,
+    'two_dead': ['dead'] * 2 + ['healthy'] * 4,
+    'all_slow': ['slow'] * 6,
+}
+
+# 压测时应用使用的默认配置, 关闭后台健康探测以测量实时探测路径
+DEFAULT_ENV = {
+    'HEALTH_CHECK': '0',
+    'PROBE_TIMEOUT': '3',
+    'PARSE_DEADLINE': '5',
+    'SINGLE_FLIGHT_TIMEOUT': '6',
+    'LOG_FILE': '',
+}
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(q / 100 * len(values))) - 1))
+    return values[index]
+
+
+def wait_ready(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f'http://127.0.0.1:{port}/', timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError('服务启动超时')
+
+
+def start_app(target, apis, workers, threads, extra_env):
+    port = free_port()
+    workdir = tempfile.mkdtemp(prefix='loadtest-')
+    env = dict(os.environ, **DEFAULT_ENV)
+    env.update(
+        PARSE_APIS=','.join(apis),
+        HEALTH_DB_PATH=os.path.join(workdir, 'health.db'),
+        PYTHONPATH=ROOT,
+    )
+    env.update(extra_env)
+    worker_class, app = TARGETS[target][:-1], TARGETS[target][-1]
+    cmd = [sys.executable, '-m', 'gunicorn', '-w', str(workers), '--threads', str(threads),
+           '-b', f'127.0.0.1:{port}', '--chdir', ROOT, '--log-level', 'warning',
+           '--backlog', '4096', *worker_class, app]
+    process = subprocess.Popen(cmd, env=env, cwd=workdir,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(port)
+    except RuntimeError:
+        process.terminate()
+        raise
+    return process, port
+
+
+def drive(port, concurrency, duration, warmup, distinct):
+    """以固定并发持续请求 /parse, 返回成功请求的延迟列表和失败数
+
+    distinct 为 0 时每个请求使用不同的视频地址(全部缓存未命中),
+    否则在 distinct 个地址中循环, 模拟热门视频的重复解析.
+    """
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    start = time.monotonic()
+    measure_from = start + warmup
+    stop_at = measure_from + duration
+
+    def worker(n):
+        session = requests.Session()
+        i = 0
+        while True:
+            now = time.monotonic()
+            if now >= stop_at:
+                return
+            vid = f'{n}x{i}' if not distinct else str((n * 7919 + i) % distinct)
+            i += 1
+            try:
+                response = session.post(f'http://127.0.0.1:{port}/parse',
+                                        json={'url': f'https://v.qq.com/x/page/lt{vid}.html'},
+                                        timeout=30)
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            elapsed = time.monotonic() - now
+            if now < measure_from:
+                continue
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0]
+
+
+def run_scenario(target, scenario, args, extra_env):
+    stub_process, apis = spawn_stubs(SCENARIOS[scenario], hang=float(DEFAULT_ENV['PROBE_TIMEOUT']) * 2)
+    process = None
+    try:
+        process, port = start_app(target, apis, args.workers, args.threads, extra_env)
+        latencies, errors = drive(port, args.concurrency, args.duration, args.warmup, args.distinct)
+    finally:
+        for proc in (process, stub_process):
+            if proc:
+                proc.terminate()
+                proc.wait()
+    total = len(latencies) + errors
+    return {
+        'rps': round(len(latencies) / args.duration, 1),
+        'p50': round(percentile(latencies, 50) * 1000, 1),
+        'p95': round(percentile(latencies, 95) * 1000, 1),
+        'p99': round(percentile(latencies, 99) * 1000, 1),
+        'errors': errors,
+        'error_rate': round(errors / total, 4) if total else 0.0,
+    }
+
+
+def compare(name, result, baseline, tolerance, error_tolerance):
+    """与基线比较, RPS 下降或 p99 上升超过相对容差、失败率上升超过绝对容差视为退化"""
+    base = baseline.get(name)
+    if not base:
+        return '无基线', False
+    error_delta = result['error_rate'] - base.get('error_rate', 0.0)
+    regressed = (result['rps'] < base['rps'] * (1 - tolerance)
+                 or result['p99'] > base['p99'] * (1 + tolerance)
+                 or error_delta > error_tolerance)
+    summary = (f"rps {result['rps'] - base['rps']:+.1f}, p99 {result['p99'] - base['p99']:+.1f}ms, "
+               f"失败率 {error_delta * 100:+.2f}%")
+    return ('退化 ' if regressed else '正常 ') + summary, regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--targets', default='video_parser,index', help=f"逗号分隔: {','.join(TARGETS)}")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='逗号分隔的场景名')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10, help='每个场景的计时时长(秒)')
+    parser.add_argument('--warmup', type=float, default=2, help='预热时长(秒), 不计入结果')
+    parser.add_argument('--distinct', type=int, default=0, help='循环使用的视频地址数, 0 表示每次不同')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker 数')
+    parser.add_argument('--threads', type=int, default=32, help='每个 worker 的线程数')
+    parser.add_argument('--env', action='append', default=[], help='额外的应用环境变量 KEY=VALUE')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='RPS 和 p99 判定退化的相对容差')
+    parser.add_argument('--error-tolerance', type=float, default=0.01, help='失败率判定退化的绝对容差')
+    parser.add_argument('--save-baseline', action='store_true', help='把本次结果写入基线')
+    args = parser.parse_args()
+
+    extra_env = dict(item.split('=', 1) for item in args.env)
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    results, regressed = {}, False
+    print(f"{'场景':<28}{'RPS':>9}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'失败':>7}{'失败率':>8}  对比基线")
+    for target in args.targets.split(','):
+        for scenario in args.scenarios.split(','):
+            name = f'{target}/{scenario}'
+            result = results[name] = run_scenario(target, scenario, args, extra_env)
+            verdict, bad = compare(name, result, baseline, args.tolerance, args.error_tolerance)
+            regressed = regressed or bad
+            print(f"{name:<28}{result['rps']:>9.1f}{result['p50']:>10.1f}{result['p95']:>10.1f}"
+                  f"{result['p99']:>10.1f}{result['errors']:>7}{result['error_rate'] * 100:>7.2f}%  {verdict}",
+                  flush=True)
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(BASELINE_PATH, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2, ensure_ascii=False, sort_keys=True)
+            f.write('\n')
+        print(f'基线已写入 {BASELINE_PATH}')
+    elif regressed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""对比同步 (gunicorn gthread) 与 ASGI (uvicorn) 模式下每个并发请求的内存占用
+
+启动一个固定延迟的本地上游, 分别以两种模式启动解析服务, 同时挂起
+N 个 /parse 请求, 在请求全部挂起时采样服务进程树的 RSS.
+
+用法: python bench/memory_compare.py --concurrency 200 --delay 3
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_upstream(delay):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_HEAD(self):
+            time.sleep(delay)
+            self.send_response(200)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    ThreadingHTTPServer.request_queue_size = 4096
+    server = ThreadingHTTPServer(('127.0.0.1', free_port()), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def tree_rss(pid):
+    """进程及其所有子进程的 RSS 之和(KB)"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+                children.setdefault(ppid, []).append(int(entry))
+            except (OSError, ValueError, IndexError):
+                pass
+    total, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        stack.extend(children.get(current, []))
+        try:
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+        except OSError:
+            pass
+    return total
+
+
+def wait_ready(port, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f'http://127.0.0.1:{port}/stats', timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError('服务启动超时')
+
+
+def measure(mode, concurrency, delay, upstream_port):
+    port = free_port()
+    workdir = tempfile.mkdtemp()
+    env = dict(
+        os.environ,
+        PARSE_APIS=f'http://127.0.0.1:{upstream_port}/?url=',
+        HEALTH_CHECK='0',
+        HEALTH_DB_PATH=os.path.join(workdir, 'health.db'),
+        PROBE_WORKERS=str(concurrency),
+        PARSE_DEADLINE=str(delay * 3),
+        PROBE_TIMEOUT=str(delay * 3),
+        SINGLE_FLIGHT_TIMEOUT=str(delay * 3)
+    )
+    if mode == 'sync':
+        cmd = [sys.executable, '-m', 'gunicorn', '-w', '1', '-k', 'gthread',
+               '--threads', str(concurrency), '-b', f'127.0.0.1:{port}',
+               '--chdir', ROOT, 'video_parser:create_app()']
+    else:
+        cmd = [sys.executable, '-m', 'uvicorn', '--app-dir', ROOT, '--port', str(port),
+               '--log-level', 'warning', '--backlog', '4096', 'asgi_app:app']
+    server = subprocess.Popen(cmd, env=env, cwd=workdir,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(port)
+        # 预热一次, 让连接池和线程池初始化
+        requests.post(f'http://127.0.0.1:{port}/parse', json={'url': 'https://v.qq.com/x/page/warm.html'})
+        idle = tree_rss(server.pid)
+
+        def call(i):
+            return requests.post(f'http://127.0.0.1:{port}/parse',
+                                 json={'url': f'https://v.qq.com/x/page/m{i}.html'},
+                                 timeout=delay * 5).status_code
+
+        peak = idle
+        with ThreadPoolExecutor(concurrency) as pool:
+            futures = [pool.submit(call, i) for i in range(concurrency)]
+            while not all(f.done() for f in futures):
+                peak = max(peak, tree_rss(server.pid))
+                time.sleep(0.05)
+            ok = sum(f.result() == 200 for f in futures)
+        return idle, peak, ok
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--delay', type=float, default=3.0, help='上游响应延迟(秒)')
+    parser.add_argument('--modes', default='sync,asgi')
+    args = parser.parse_args()
+
+    upstream = start_upstream(args.delay)
+    print(f'并发 {args.concurrency}, 上游延迟 {args.delay}s')
+    print(f"{'模式':<6}{'空闲RSS(MB)':>14}{'峰值RSS(MB)':>14}{'每请求(KB)':>12}{'成功':>8}")
+    for mode in args.modes.split(','):
+        idle, peak, ok = measure(mode, args.concurrency, args.delay, upstream.server_port)
+        per_request = (peak - idle) / max(args.concurrency, 1)
+        print(f'{mode:<6}{idle / 1024:>14.1f}{peak / 1024:>14.1f}{per_request:>12.1f}{ok:>8}')
+
+
+if __name__ == '__main__':
+    main()
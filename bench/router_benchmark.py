@@ -0,0 +1,81 @@
+"""平台路由微基准: 对比旧的子串扫描 is_valid_url 与预编译的 PlatformRouter
+
+生成约 100 万个混合地址 (各平台正常链接、移动端/分享链接、伪造主机、无关站点),
+分别用两种方式校验, 输出耗时、加速比以及判定结果不一致的地址数.
+
+用法: python bench/router_benchmark.py --count 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from platforms import PlatformRouter  # noqa: E402
+from video_parser import SUPPORTED_DOMAINS  # noqa: E402
+from index import SUPPORTED_DOMAINS as INDEX_SUPPORTED_DOMAINS  # noqa: E402
+
+SAMPLES = [
+    'https://v.qq.com/x/cover/mzc00200abcdefg/x0047{n}.html?ptag=qqbrowser',
+    'https://m.v.qq.com/x/page/x0047{n}.html',
+    'https://www.iqiyi.com/v_19rr{n}.html?vfm=2008_aldbd',
+    'https://v.youku.com/v_show/id_XNTk{n}.html?spm=a2hja.14919748',
+    'https://www.mgtv.com/b/33{n}/1{n}.html?fpa=se',
+    'https://www.bilibili.com/video/BV1xx411c{n}/?spm_id_from=333.1007.tianma',
+    'https://m.bilibili.com/bangumi/play/ep{n}',
+    'https://www.douyin.com/discover?modal_id=73{n}',
+    'https://www.kuaishou.com/short-video/3x{n}abc',
+    # 伪造主机和无关站点
+    'https://evil.com/?v.qq.com/{n}',
+    'https://phishing.example/iqiyi.com/v_{n}.html',
+    'https://www.google.com/search?q=bilibili+{n}',
+    'https://github.com/aur22/potential-journey/issues/{n}',
+    'ftp://v.qq.com/x/page/{n}.html',
+]
+
+
+def legacy_checker(domains):
+    """旧实现: 对整个地址做小写后逐个域名子串扫描"""
+    def is_valid_url(url):
+        return any(domain in url.lower() for domain in domains)
+    return is_valid_url
+
+
+def run(check, urls):
+    start = time.perf_counter()
+    accepted = 0
+    for url in urls:
+        if check(url):
+            accepted += 1
+    return time.perf_counter() - start, accepted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=1000000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    urls = [rng.choice(SAMPLES).format(n=rng.randrange(10 ** 8)) for _ in range(args.count)]
+    print(f'地址数: {len(urls)}')
+
+    for app, domains in (('video_parser', SUPPORTED_DOMAINS), ('index', INDEX_SUPPORTED_DOMAINS)):
+        legacy = legacy_checker(domains)
+        router = PlatformRouter(domains)
+        legacy_time, legacy_accepted = run(legacy, urls)
+        router_time, router_accepted = run(router.match, urls)
+        mismatched = sum(legacy(url) != (router.match(url) is not None) for url in urls)
+
+        print(f'\n[{app}] 支持域名 {len(domains)} 个')
+        print(f"{'实现':<8}{'耗时(s)':>10}{'每次(ns)':>12}{'接受数':>10}")
+        for name, elapsed, accepted in (('legacy', legacy_time, legacy_accepted),
+                                        ('router', router_time, router_accepted)):
+            print(f'{name:<8}{elapsed:>10.3f}{elapsed / len(urls) * 1e9:>12.0f}{accepted:>10}')
+        print(f'加速比: {legacy_time / router_time:.2f}x')
+        print(f'判定不一致 (旧实现误收的伪造地址): {mismatched}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""本地模拟解析线路
+
+为每条解析线路启动一个本地 HTTP 服务, 按配置的延迟、错误率和超时比例
+响应 HEAD/GET 请求, 用于离线压测, 不访问真实的第三方解析接口.
+
+单独运行: python bench/upstream_stub.py --lines 6 --profile healthy
+          python bench/upstream_stub.py --profiles dead,healthy,healthy
+"""
+import argparse
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# 预置的线路表现
+PROFILES = {
+    'healthy': {'latency': 0.05, 'jitter': 0.02},
+    'slow': {'latency': 1.5, 'jitter': 0.5},
+    'flaky': {'latency': 0.1, 'jitter': 0.05, 'error_rate': 0.3},
+    'dead': {'timeout_rate': 1.0},
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 4096
+
+
+class UpstreamStub:
+    """一条模拟解析线路
+
+    latency/jitter: 正常响应的延迟均值和抖动(秒)
+    error_rate: 返回 503 的比例
+    timeout_rate: 不响应的比例, 挂起 hang 秒后直接断开连接
+    """
+
+    def __init__(self, latency=0.05, jitter=0.0, error_rate=0.0, timeout_rate=0.0, hang=30.0, port=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.hang = hang
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_HEAD(self):
+                stub.handle(self, with_body=False)
+
+            def do_GET(self):
+                stub.handle(self, with_body=True)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = StubServer(('127.0.0.1', port or free_port()), Handler)
+        self.port = self.server.server_port
+        self.url = f'http://127.0.0.1:{self.port}/?url='
+
+    @classmethod
+    def from_profile(cls, profile, **overrides):
+        options = dict(PROFILES[profile] if isinstance(profile, str) else profile)
+        options.update(overrides)
+        return cls(**options)
+
+    def handle(self, request, with_body):
+        with self._lock:
+            self.requests += 1
+        roll = random.random()
+        if roll < self.timeout_rate:
+            # 模拟上游无响应, 挂起后断开
+            self._stopped.wait(self.hang)
+            request.close_connection = True
+            return
+        time.sleep(max(0.0, random.gauss(self.latency, self.jitter) if self.jitter else self.latency))
+        status = 503 if roll < self.timeout_rate + self.error_rate else 200
+        body = b'<html>stub</html>' if status == 200 else b''
+        request.send_response(status)
+        request.send_header('Content-Type', 'text/html')
+        request.send_header('Content-Length', str(len(body)))
+        request.end_headers()
+        if with_body:
+            request.wfile.write(body)
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def start_stubs(profiles, **overrides):
+    """按线路表现列表启动多条模拟线路"""
+    return [UpstreamStub.from_profile(profile, **overrides).start() for profile in profiles]
+
+
+def spawn_stubs(profiles, hang=None):
+    """在独立进程中启动模拟线路, 返回 (进程, 线路地址列表)
+
+    压测客户端的线程和模拟线路不在同一个解释器里争用 GIL,
+    客户端的 CPU 开销不会抬高模拟线路的响应延迟.
+    """
+    cmd = [sys.executable, os.path.abspath(__file__), '--profiles', ','.join(profiles)]
+    if hang is not None:
+        cmd += ['--hang', str(hang)]
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline().strip()
+    if not line.startswith('PARSE_APIS='):
+        process.kill()
+        process.wait()
+        raise RuntimeError('模拟线路启动失败')
+    return process, line.split('=', 1)[1].split(',')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lines', type=int, default=6)
+    parser.add_argument('--profile', default='healthy', choices=sorted(PROFILES))
+    parser.add_argument('--profiles', help='逗号分隔的各线路表现, 指定后忽略 --lines/--profile')
+    parser.add_argument('--hang', type=float, help='无响应线路挂起的时长(秒)')
+    args = parser.parse_args()
+
+    profiles = args.profiles.split(',') if args.profiles else [args.profile] * args.lines
+    overrides = {'hang': args.hang} if args.hang is not None else {}
+    stubs = start_stubs(profiles, **overrides)
+    print('PARSE_APIS=' + ','.join(stub.url for stub in stubs), flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        for stub in stubs:
+            stub.stop()
+
+
+if __name__ == '__main__':
+    main()
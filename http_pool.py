@@ -0,0 +1,295 @@
+import os
+import socket
+import threading
+import time
+import logging
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+logger = logging.getLogger(__name__)
+
+
+class _Counters:
+    """线程安全的计数器"""
+
+    def __init__(self, *names):
+        self._lock = threading.Lock()
+        self._values = dict.fromkeys(names, 0)
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self._values[name] += value
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def reset(self):
+        # fork 后锁可能处于被持有状态, 直接重建
+        self._lock = threading.Lock()
+        self._values = dict.fromkeys(self._values, 0)
+
+
+class DNSCache:
+    """带过期时间的 DNS 解析缓存
+
+    按 (主机, 端口) 缓存 getaddrinfo 结果, 只供 SessionPool 自己的连接类使用,
+    不影响进程内其他 requests/urllib3 调用.
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self.counters = _Counters('dns_hits', 'dns_misses')
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, host, port):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((host, port))
+        if entry and entry[1] > now:
+            self.counters.incr('dns_hits')
+            return entry[0]
+        self.counters.incr('dns_misses')
+        infos = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        with self._lock:
+            self._entries[(host, port)] = (addresses, now + self.ttl)
+        return addresses
+
+    def discard(self, host, port):
+        with self._lock:
+            self._entries.pop((host, port), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def reset(self):
+        # fork 后锁可能处于被持有状态, 直接重建
+        self._lock = threading.Lock()
+        self.counters.reset()
+
+
+class AbortHandle:
+    """可由其他线程中断的请求
+
+    发起请求的线程通过 SessionPool.request(..., abort=handle) 把本次请求使用的
+    连接绑定到句柄上; 其他线程调用 abort() 时关闭该连接的 socket, 阻塞在读取
+    响应上的请求立即以连接错误结束, 不必等到读超时. 建立连接阶段不可中断,
+    仍受 connect_timeout 限制.
+    """
+
+    def __init__(self):
+        self.aborted = False
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def attach(self, conn):
+        with self._lock:
+            if self.aborted:
+                raise ConnectionAbortedError('请求已中断')
+            self._conn = conn
+
+    def detach(self, conn):
+        """连接归还连接池前解除绑定, 之后的 abort() 不会影响复用该连接的其他请求"""
+        with self._lock:
+            if self._conn is conn:
+                self._conn = None
+
+    def abort(self):
+        with self._lock:
+            self.aborted = True
+            sock = getattr(self._conn, 'sock', None)
+            self._conn = None
+            if sock is not None:
+                try:
+                    # 绕过 SSLSocket.shutdown, 只关闭底层连接, 读线程自行处理 TLS 状态
+                    socket.socket.shutdown(sock, socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+
+class _PoolConnection:
+    """SessionPool 使用的 urllib3 连接类混入
+
+    建立连接时使用 DNS 缓存, 依次尝试缓存中的各个地址, 全部失败则丢弃缓存;
+    只在建立 TCP 连接期间把目标换成 IP, TLS 的 SNI 和证书校验仍使用原主机名.
+    发送请求和读取响应前把连接绑定到当前线程的中断句柄.
+    """
+
+    dns = None
+    local = None
+    abort_handle = None
+
+    def _attach(self):
+        handle = getattr(self.local, 'abort', None)
+        if handle is not None:
+            handle.attach(self)
+            self.abort_handle = handle
+
+    def detach(self):
+        handle, self.abort_handle = self.abort_handle, None
+        if handle is not None:
+            handle.detach(self)
+
+    def request(self, *args, **kwargs):
+        self._attach()
+        return super().request(*args, **kwargs)
+
+    def getresponse(self, *args, **kwargs):
+        # 新连接在发送请求时才建立, 此时再绑定一次以便中断读取响应
+        self._attach()
+        return super().getresponse(*args, **kwargs)
+
+    def _new_conn(self):
+        if self.dns is None:
+            return super()._new_conn()
+        host = self._dns_host
+        try:
+            addresses = self.dns.resolve(host, self.port)
+        except socket.gaierror:
+            return super()._new_conn()
+        error = None
+        try:
+            for ip in addresses:
+                self._dns_host = ip
+                try:
+                    return super()._new_conn()
+                except (ConnectTimeoutError, NewConnectionError) as e:
+                    error = e
+        finally:
+            self._dns_host = host
+        self.dns.discard(host, self.port)
+        raise error
+
+
+class SessionPool:
+    """按上游主机划分的 keep-alive 会话池
+
+    每个 (协议, 主机, 端口) 使用一个 requests.Session, 连接池大小为
+    pool_size, 连接在请求之间复用, 避免每次探测都重新建连和 TLS 握手.
+    fork 之后子进程自动丢弃从父进程继承的会话和连接. 请求可传入 AbortHandle,
+    由其他线程提前中断.
+    """
+
+    def __init__(self, pool_size=10, connect_timeout=3.05, read_timeout=5,
+                 dns_ttl=60, headers=None):
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.headers = headers or {}
+        self.counters = _Counters('session_hits', 'session_misses', 'requests', 'connections')
+        self.dns = None
+        if dns_ttl:
+            self.dns = DNSCache(dns_ttl)
+
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._pid = os.getpid()
+        self._pool_classes = self._make_pool_classes()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.reset)
+
+    def _make_pool_classes(self):
+        """生成统计新建连接数的连接池类, 连接池使用带 DNS 缓存和中断支持的连接类"""
+        counters = self.counters
+        attrs = {'dns': self.dns, 'local': self._local}
+
+        class CountingHTTPConnectionPool(HTTPConnectionPool):
+            ConnectionCls = type('PooledHTTPConnection', (_PoolConnection, HTTPConnection), attrs)
+
+            def _new_conn(self):
+                counters.incr('connections')
+                return super()._new_conn()
+
+            def _put_conn(self, conn):
+                if conn is not None:
+                    conn.detach()
+                return super()._put_conn(conn)
+
+        class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+            ConnectionCls = type('PooledHTTPSConnection', (_PoolConnection, HTTPSConnection), attrs)
+
+            def _new_conn(self):
+                counters.incr('connections')
+                return super()._new_conn()
+
+            def _put_conn(self, conn):
+                if conn is not None:
+                    conn.detach()
+                return super()._put_conn(conn)
+
+        return {'http': CountingHTTPConnectionPool, 'https': CountingHTTPSConnectionPool}
+
+    def _new_session(self):
+        session = requests.Session()
+        session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size, max_retries=0)
+        adapter.poolmanager.pool_classes_by_scheme = self._pool_classes
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def session(self, url):
+        """获取 url 所在主机的会话"""
+        if self._pid != os.getpid():
+            self.reset()
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = self._sessions[key] = self._new_session()
+                self.counters.incr('session_misses')
+            else:
+                self.counters.incr('session_hits')
+        return session
+
+    def request(self, method, url, timeout=None, abort=None, **kwargs):
+        """发送请求, timeout 为读超时, 连接超时固定为 connect_timeout
+
+        abort 为 AbortHandle 时, 其他线程可通过它中断本次请求.
+        """
+        read_timeout = self.read_timeout if timeout is None else timeout
+        self.counters.incr('requests')
+        session = self.session(url)
+        self._local.abort = abort
+        try:
+            return session.request(
+                method, url,
+                timeout=(min(self.connect_timeout, read_timeout), read_timeout),
+                **kwargs
+            )
+        finally:
+            self._local.abort = None
+
+    def head(self, url, timeout=None, abort=None, **kwargs):
+        return self.request('HEAD', url, timeout=timeout, abort=abort, **kwargs)
+
+    def get(self, url, timeout=None, abort=None, **kwargs):
+        return self.request('GET', url, timeout=timeout, abort=abort, **kwargs)
+
+    def reset(self):
+        """丢弃所有会话和统计, fork 后在子进程中调用"""
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._pid = os.getpid()
+        self.counters.reset()
+        if self.dns:
+            self.dns.reset()
+
+    def stats(self):
+        """连接池统计: 会话命中/未命中, 请求数, 新建连接(握手)数和复用数"""
+        stats = self.counters.snapshot()
+        stats['reused'] = max(stats['requests'] - stats['connections'], 0)
+        stats['hosts'] = len(self._sessions)
+        if self.dns:
+            stats.update(self.dns.counters.snapshot())
+        return stats
@@ -1,8 +1,12 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory
 from flask_cors import CORS
 import requests
 import re
 import os
+import json
+from upstream_health import HealthBoard
+from http_pool import SessionPool
+from platforms import PlatformRouter
 
 app = Flask(__name__, static_folder='public', static_url_path='')
 CORS(app)
@@ -16,18 +20,43 @@ PARSE_APIS = [
     "https://jx.quankan.app/?url=",            # 备用线路4
 ]
 
+# 可通过环境变量覆盖解析接口列表, 多个接口以逗号分隔
+if os.environ.get('PARSE_APIS'):
+    PARSE_APIS = [api.strip() for api in os.environ['PARSE_APIS'].split(',') if api.strip()]
+
+# 上游 keep-alive 会话池
+http_pool = SessionPool(pool_size=int(os.environ.get('HTTP_POOL_SIZE', 10)))
+
+def probe_api(api):
+    """探测解析接口是否可用"""
+    probe_url = os.environ.get('HEALTH_PROBE_URL', 'https://v.qq.com/')
+    try:
+        response = http_pool.head(api + probe_url, timeout=5, allow_redirects=True)
+        return response.status_code == 200
+    except requests.RequestException:
+        return False
+
+# 解析接口健康记分板, 与 video_parser 共享同一状态库
+health_board = HealthBoard(
+    PARSE_APIS,
+    probe=probe_api,
+    db_path=os.environ.get('HEALTH_DB_PATH'),
+    interval=float(os.environ.get('HEALTH_INTERVAL', 30)),
+    cooldown=float(os.environ.get('BREAKER_COOLDOWN', 60))
+)
+
 # 支持的视频平台
 SUPPORTED_DOMAINS = [
     'v.qq.com', 'iqiyi.com', 'youku.com', 'mgtv.com', 'bilibili.com',
     'sohu.com', 'le.com', 'pptv.com', '1905.com', 'fun.tv', 'douyin.com'
 ]
 
+# 平台路由表, 按主机名识别视频平台
+platform_router = PlatformRouter(SUPPORTED_DOMAINS)
+
 def is_valid_url(url):
     """检查URL是否为支持的视频网站"""
-    try:
-        return any(domain in url.lower() for domain in SUPPORTED_DOMAINS)
-    except:
-        return False
+    return platform_router.match(url) is not None
 
 @app.route('/')
 def index():
@@ -56,17 +85,20 @@ def parse():
             return jsonify({'error': '请提供视频URL'}), 400
 
         # 验证URL
-        if not is_valid_url(url):
+        platform = platform_router.match(url)
+        if not platform:
             return jsonify({'error': '不支持的视频平台或无效的URL'}), 400
 
-        # 尝试所有解析接口
-        for api in PARSE_APIS:
+        # 按健康排名尝试解析接口
+        if os.environ.get('HEALTH_CHECK', '1') == '1':
+            health_board.start()
+        for api in health_board.ranked():
             try:
                 parse_url = api + url
                 response = jsonify({
                     'url': parse_url,
                     'title': '视频播放',
-                    'platform': 'other'
+                    'platform': platform.name
                 })
                 response.headers.update({
                     'Access-Control-Allow-Origin': '*',
@@ -83,6 +115,58 @@ def parse():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/parse/batch', methods=['POST', 'OPTIONS'])
+def parse_batch():
+    # 处理 OPTIONS 请求
+    if request.method == 'OPTIONS':
+        response = jsonify({'status': 'ok'})
+        response.headers.update({
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': 'POST, OPTIONS',
+            'Access-Control-Allow-Headers': 'Content-Type'
+        })
+        return response
+
+    data = request.get_json(silent=True)
+    urls = data.get('urls') if isinstance(data, dict) else None
+    if not urls or not isinstance(urls, list):
+        return jsonify({'error': '请提供视频URL列表'}), 400
+
+    max_urls = int(os.environ.get('BATCH_MAX_URLS', 200))
+    if len(urls) > max_urls:
+        return jsonify({'error': f'单次最多解析 {max_urls} 个URL'}), 400
+
+    # 先校验全部URL, 任何一个无效则整批拒绝
+    invalid = [i for i, url in enumerate(urls)
+               if not isinstance(url, str) or not url.strip() or not is_valid_url(url)]
+    if invalid:
+        return jsonify({'error': '不支持的视频平台或无效的URL', 'invalid': invalid}), 400
+
+    if os.environ.get('HEALTH_CHECK', '1') == '1':
+        health_board.start()
+    api = health_board.ranked()[0]
+
+    # 本接口不探测上游, 逐条生成结果即可
+    def generate():
+        for index, url in enumerate(urls):
+            url = url.strip()
+            yield json.dumps({
+                'index': index,
+                'input': url,
+                'url': api + url,
+                'title': '视频播放',
+                'platform': platform_router.match(url).name
+            }, ensure_ascii=False) + '\n'
+
+    response = Response(generate(), mimetype='application/x-ndjson')
+    response.headers.update({
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Methods': 'POST, OPTIONS',
+        'Access-Control-Allow-Headers': 'Content-Type',
+        'Cache-Control': 'no-cache'
+    })
+    return response
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port) 
\ No newline at end of file
@@ -0,0 +1,330 @@
+import atexit
+import bisect
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 默认直方图分桶(秒), 覆盖缓存命中的微秒级到上游超时的秒级
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def reset(self):
+        # fork 后锁可能处于被持有状态, 直接重建
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def items(self):
+        with self._lock:
+            return [(key, list(value) if isinstance(value, list) else value)
+                    for key, value in self._values.items()]
+
+    def render(self, items=None):
+        """输出文本格式; items 为其他来源(如多进程汇总)的 (标签值, 取值) 列表"""
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self._render_samples(sorted(self.items() if items is None else items)))
+        return lines
+
+    def _render_samples(self, items):
+        return [f'{self.name}{_format_labels(self.labels, key)} {_format_value(value)}'
+                for key, value in items]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, value=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, value=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def dec(self, value=1, **labels):
+        self.inc(-value, **labels)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # 各分桶计数 + 总和 + 总数
+                counts = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                counts[index] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def _render_samples(self, items):
+        lines = []
+        for key, counts in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.labels, key, [('le', _format_value(float(bound)))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labels, key, [('le', '+Inf')])
+            lines.append(f'{self.name}_bucket{labels} {counts[-1]}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labels, key)} {_format_value(counts[-2])}')
+            lines.append(f'{self.name}_count{_format_labels(self.labels, key)} {counts[-1]}')
+        return lines
+
+
+class Registry:
+    """进程内指标注册表, 输出 Prometheus 文本格式
+
+    指定 path 时多进程汇总: 各进程每隔 flush_interval 秒以及被抓取时把本进程的
+    指标写入该 sqlite 文件, 抓取时合并所有进程的值 (见 _SharedStore), gunicorn
+    多 worker 下每次抓取都得到整个实例的总量. 未指定 path 时指标按进程统计,
+    只适合单 worker 部署. collect() 注册的回调在抓取时执行, 用于输出熔断状态
+    等外部状态, 不参与汇总.
+    """
+
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self, path=None, flush_interval=5):
+        self._metrics = []
+        self._collectors = []
+        self.store = _SharedStore(path) if path else None
+        self.flush_interval = flush_interval
+        if self.store:
+            self._start_flusher()
+            atexit.register(self.flush)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self._add(Gauge(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def collect(self, fn):
+        """注册抓取时执行的回调, 回调返回指标列表"""
+        self._collectors.append(fn)
+        return fn
+
+    def reset(self):
+        for metric in self._metrics:
+            metric.reset()
+
+    def _after_fork(self):
+        # 子进程从零开始计数, 并启动自己的写入线程
+        self.reset()
+        if self.store:
+            self._start_flusher()
+
+    def _start_flusher(self):
+        thread = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+        thread.start()
+
+    def _flush_loop(self):
+        pid = os.getpid()
+        while os.getpid() == pid:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """把本进程的指标写入共享存储"""
+        if self.store:
+            self.store.write(self._metrics)
+
+    def render(self):
+        lines = []
+        if self.store:
+            self.flush()
+            merged = self.store.read()
+            for metric in self._metrics:
+                lines.extend(metric.render(merged.get(metric.name, [])))
+        else:
+            for metric in self._metrics:
+                lines.extend(metric.render())
+        for collector in self._collectors:
+            for metric in collector():
+                lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS metric_values (
+    pid INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (pid, name, labels)
+)
+"""
+
+# 已退出进程的累计值并入的虚拟进程号
+_RETIRED_PID = 0
+
+
+class _SharedStore:
+    """多进程指标的 sqlite 存储
+
+    每个进程一组行, 按 (进程号, 指标名, 标签值) 覆盖写入. 读取时 counter 和
+    histogram 按进程求和; 已退出进程的 counter/histogram 并入进程号 0 的行保留,
+    总量不会因 worker 重启而回退; 已退出进程的 gauge 直接删除. 进程第一次写入
+    前先归档同一进程号的旧行, 进程号被复用时不会覆盖上一个进程的累计值.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._owner = None
+        try:
+            self._connect().execute(_SCHEMA)
+        except sqlite3.Error as e:
+            logger.error(f"初始化指标存储失败: {str(e)}")
+
+    def _connect(self):
+        """获取当前线程的数据库连接, fork 后自动重建"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def write(self, metrics):
+        pid = os.getpid()
+        rows = [(pid, metric.name, json.dumps(key), metric.kind, json.dumps(value))
+                for metric in metrics for key, value in metric.items()]
+        try:
+            conn = self._connect()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if self._owner != pid:
+                    self._retire(conn, pid)
+                conn.executemany(
+                    'INSERT OR REPLACE INTO metric_values (pid, name, labels, kind, value) '
+                    'VALUES (?, ?, ?, ?, ?)', rows)
+                self._retire_dead(conn)
+                conn.execute('COMMIT')
+                self._owner = pid
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        except sqlite3.Error as e:
+            logger.error(f"写入指标失败: {str(e)}")
+
+    def _retire_dead(self, conn):
+        pids = [row[0] for row in conn.execute('SELECT DISTINCT pid FROM metric_values')]
+        for pid in pids:
+            if pid != _RETIRED_PID and not _alive(pid):
+                self._retire(conn, pid)
+
+    def _retire(self, conn, pid):
+        rows = conn.execute(
+            'SELECT name, labels, kind, value FROM metric_values WHERE pid = ? AND kind != ?',
+            (pid, 'gauge')).fetchall()
+        for name, labels, kind, value in rows:
+            retired = conn.execute(
+                'SELECT value FROM metric_values WHERE pid = ? AND name = ? AND labels = ?',
+                (_RETIRED_PID, name, labels)).fetchone()
+            if retired:
+                value = json.dumps(_add_values(json.loads(retired[0]), json.loads(value)))
+            conn.execute(
+                'INSERT OR REPLACE INTO metric_values (pid, name, labels, kind, value) '
+                'VALUES (?, ?, ?, ?, ?)', (_RETIRED_PID, name, labels, kind, value))
+        conn.execute('DELETE FROM metric_values WHERE pid = ?', (pid,))
+
+    def read(self):
+        """返回 {指标名: [(标签值, 合计值)]}"""
+        try:
+            rows = self._connect().execute('SELECT name, labels, value FROM metric_values').fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"读取指标失败: {str(e)}")
+            return {}
+        merged = {}
+        for name, labels, value in rows:
+            values = merged.setdefault(name, {})
+            key = tuple(json.loads(labels))
+            value = json.loads(value)
+            values[key] = value if key not in values else _add_values(values[key], value)
+        return {name: list(values.items()) for name, values in merged.items()}
+
+
+def _add_values(a, b):
+    """合并两个取值: 数值直接相加, histogram 的计数列表逐项相加"""
+    if isinstance(a, list):
+        if not isinstance(b, list) or len(a) != len(b):
+            return b
+        return [x + y for x, y in zip(a, b)]
+    return a + b
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -0,0 +1,170 @@
+import re
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+# 分享链接中常见的跟踪参数, 归一化时忽略
+TRACKING_PARAMS = {
+    'spm', 'spm_id_from', 'from', 'share_source', 'share_medium', 'share_plat',
+    'share_tag', 'share_from', 'share_times', 'bbid', 'ts', 'timestamp', 'ptag',
+    'vd_source', 'unique_k', 'utm_source', 'utm_medium', 'utm_campaign',
+    'utm_term', 'utm_content', 'is_from_webapp', 'sender_device', 'scm'
+}
+
+
+class Platform:
+    """视频平台记录: 域名、视频ID提取规则和优先解析接口
+
+    select 为视频ID之外决定具体内容的查询参数, 如 B 站多P视频的分P参数 p,
+    这些参数保留在缓存键中.
+    """
+
+    __slots__ = ('name', 'domains', 'pattern', 'param', 'apis', 'select')
+
+    def __init__(self, name, domains, pattern=None, param=None, apis=(), select=()):
+        self.name = name
+        self.domains = tuple(domains)
+        self.pattern = re.compile(pattern) if pattern else None
+        self.param = param
+        self.apis = tuple(apis)
+        self.select = tuple(select)
+
+    def extract_id(self, url):
+        """提取视频ID, 无法识别时返回 None"""
+        parts = urlsplit(url.strip())
+        if self.param:
+            for name, value in parse_qsl(parts.query):
+                if name == self.param and value:
+                    return value
+        if self.pattern:
+            match = self.pattern.search(parts.path)
+            if match:
+                return match.group(1)
+        return None
+
+    def selection(self, url):
+        """提取 select 中的查询参数, 返回按名称排序的查询串, 没有时返回空串"""
+        if not self.select:
+            return ''
+        query = urlsplit(url.strip()).query
+        return urlencode(sorted((k, v) for k, v in parse_qsl(query) if k in self.select))
+
+    def with_apis(self, apis):
+        """返回指定优先解析接口的副本"""
+        return Platform(self.name, self.domains, self.pattern.pattern if self.pattern else None,
+                        self.param, apis, self.select)
+
+    def __repr__(self):
+        return f'Platform({self.name!r})'
+
+
+# 已知视频平台
+PLATFORMS = [
+    Platform('qq', ['v.qq.com'],
+             r'/(?:x/cover/[^/]+|x/page|cover/[^/]+)/(\w+)\.html', 'vid'),
+    Platform('iqiyi', ['iqiyi.com'], r'/(v_\w+|a_\w+)\.html'),
+    Platform('youku', ['youku.com'], r'/id_([\w=]+?)(?:\.html|$)', 'vid'),
+    Platform('mgtv', ['mgtv.com'], r'/b/\d+/(\d+)\.html'),
+    Platform('bilibili', ['bilibili.com'], r'/(?:video|bangumi/play)/(BV\w+|av\d+|ep\d+|ss\d+)',
+             select=['p']),
+    Platform('douyin', ['douyin.com'], r'/video/(\d+)', 'modal_id'),
+    Platform('kuaishou', ['kuaishou.com'], r'/(?:short-video|fw/photo)/(\w+)'),
+    Platform('sohu', ['sohu.com'], r'/v/(\w+)\.html'),
+    Platform('le', ['le.com'], r'/ptv/vplay/(\d+)\.html'),
+    Platform('pptv', ['pptv.com'], r'/show/(\w+)\.html'),
+    Platform('1905', ['1905.com'], r'/play/(\d+)\.shtml'),
+    Platform('funtv', ['fun.tv'], r'/vplay/(?:[^/]*?v-)?(g-\d+|\d+)'),
+]
+
+
+# 取出地址中的网络位置(主机名、端口、用户信息); 只有 http(s) 协议会被跳过,
+# 其余协议名会留在网络位置中, 查表时自然不命中
+_NETLOC_RE = re.compile(r'(?:[hH][tT][tT][pP][sS]?://)?([^/?#]*)')
+
+# 网络位置到平台记录的缓存上限
+_MEMO_SIZE = 4096
+
+
+class PlatformRouter:
+    """预编译的平台路由表
+
+    用预编译的正则一次取出网络位置, 按域名后缀查表得到平台记录, 查表结果
+    按网络位置缓存, 热门站点只需一次正则匹配和一次字典查找.
+    只匹配主机名, `evil.com/?v.qq.com` 这类把域名藏在路径或参数里的地址,
+    以及带用户信息的 `user@host` 地址不会被接受.
+    """
+
+    def __init__(self, domains, platforms=PLATFORMS, apis=None):
+        apis = apis or {}
+        by_domain = {domain: platform.with_apis(apis[platform.name]) if platform.name in apis else platform
+                     for platform in platforms for domain in platform.domains}
+        # 未登记的域名按域名自身建立通用平台记录
+        self._suffixes = {domain.lower(): by_domain.get(domain) or Platform(domain, [domain])
+                          for domain in domains}
+        self._max_labels = max((domain.count('.') + 1 for domain in self._suffixes), default=0)
+        self._memo = {}
+
+    def match(self, url):
+        """返回地址所属的平台记录, 不支持时返回 None"""
+        if not isinstance(url, str):
+            return None
+        if url[:1].isspace():
+            url = url.strip()
+        netloc = _NETLOC_RE.match(url).group(1)
+        try:
+            return self._memo[netloc]
+        except KeyError:
+            pass
+        platform = self._lookup(netloc)
+        if len(self._memo) >= _MEMO_SIZE:
+            self._memo.clear()
+        self._memo[netloc] = platform
+        return platform
+
+    def _lookup(self, netloc):
+        """从右往左逐级截取主机名的域名后缀查表, 最多截取到最长登记域名的级数
+
+        带用户信息或反斜杠的网络位置直接拒绝: 浏览器把 `\\` 当作路径分隔符,
+        `evil.com\\@v.qq.com` 的真实主机是 evil.com.
+        """
+        if '@' in netloc or '\\' in netloc:
+            return None
+        host = netloc.split(':', 1)[0].strip().lower().rstrip('.')
+        end = len(host)
+        for _ in range(self._max_labels):
+            end = host.rfind('.', 0, end)
+            if end < 0:
+                return self._suffixes.get(host)
+            platform = self._suffixes.get(host[end + 1:])
+            if platform is not None:
+                return platform
+        return None
+
+
+def _clean_url(url):
+    """去掉协议、移动端前缀和跟踪参数, 参数按名称排序"""
+    url = url.strip()
+    if '://' not in url:
+        url = 'https://' + url
+    parts = urlsplit(url)
+    host = (parts.hostname or '').lower()
+    for prefix in ('www.', 'm.', 'mobile.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+    query = sorted((k, v) for k, v in parse_qsl(parts.query) if k.lower() not in TRACKING_PARAMS)
+    path = parts.path.rstrip('/') or '/'
+    return host + path + ('?' + urlencode(query) if query else '')
+
+
+def canonical_key(url, platform=None):
+    """把视频地址归一化为 (平台, 视频ID[, 选集参数]) 缓存键
+
+    能提取视频ID时使用视频ID, 分P等决定具体内容的参数附在后面; 否则退化为
+    去掉跟踪参数后的主机名+路径+查询串, 保证同一链接的不同分享形式命中同一键.
+    """
+    if platform is not None:
+        video_id = platform.extract_id(url)
+        if video_id:
+            selection = platform.selection(url)
+            return (platform.name, video_id, selection) if selection else (platform.name, video_id)
+        return (platform.name, _clean_url(url))
+    return ('other', _clean_url(url))
@@ -0,0 +1,134 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# 未命中缓存的标记, 与负缓存的 None 区分
+MISS = object()
+
+
+class ResultCache:
+    """解析结果缓存
+
+    进程内 LRU, 按条目数和估算内存双重限制; 成功结果缓存 ttl 秒,
+    失败结果缓存 negative_ttl 秒. 指定 path 时额外使用 sqlite 文件
+    作为二级缓存, 同机所有 gunicorn worker 共享.
+    """
+
+    def __init__(self, maxsize=10000, max_bytes=16 * 1024 * 1024, ttl=600,
+                 negative_ttl=30, path=None):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.path = path
+
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+        if self.path:
+            self._init_db()
+
+    def _connect(self):
+        """获取当前线程的数据库连接, fork 后自动重建"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_db(self):
+        try:
+            self._connect().execute(
+                'CREATE TABLE IF NOT EXISTS result_cache '
+                '(key TEXT PRIMARY KEY, value TEXT, expires REAL NOT NULL)'
+            )
+        except sqlite3.Error as e:
+            logger.error(f"初始化结果缓存失败: {str(e)}")
+            self.path = None
+
+    @staticmethod
+    def _encode_key(key):
+        return '\x1f'.join(key)
+
+    def get(self, key):
+        """查询缓存, 未命中返回 MISS, 负缓存返回 None"""
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires, _ = entry
+                if expires > now:
+                    self._data.move_to_end(key)
+                    return value
+                self._evict(key)
+
+        if not self.path:
+            return MISS
+        try:
+            row = self._connect().execute(
+                'SELECT value, expires FROM result_cache WHERE key = ?',
+                (self._encode_key(key),)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"读取结果缓存失败: {str(e)}")
+            return MISS
+        if not row or row[1] <= now:
+            return MISS
+        value = json.loads(row[0])
+        self._store(key, value, row[1], row[0])
+        return value
+
+    def set(self, key, value):
+        """写入缓存, value 为 None 表示解析失败, 按负缓存时长保存"""
+        expires = time.time() + (self.ttl if value is not None else self.negative_ttl)
+        encoded = json.dumps(value, ensure_ascii=False)
+        self._store(key, value, expires, encoded)
+
+        if not self.path:
+            return
+        try:
+            conn = self._connect()
+            conn.execute(
+                'INSERT OR REPLACE INTO result_cache (key, value, expires) VALUES (?, ?, ?)',
+                (self._encode_key(key), encoded, expires)
+            )
+            self._writes += 1
+            if self._writes % 1000 == 0:
+                conn.execute('DELETE FROM result_cache WHERE expires <= ?', (time.time(),))
+        except sqlite3.Error as e:
+            logger.error(f"写入结果缓存失败: {str(e)}")
+
+    def _store(self, key, value, expires, encoded):
+        size = len(encoded) + sum(len(part) for part in key) + 200
+        with self._lock:
+            if key in self._data:
+                self._evict(key)
+            self._data[key] = (value, expires, size)
+            self._bytes += size
+            while self._data and (len(self._data) > self.maxsize or self._bytes > self.max_bytes):
+                self._evict(next(iter(self._data)))
+
+    def _evict(self, key):
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+        if self.path:
+            try:
+                self._connect().execute('DELETE FROM result_cache')
+            except sqlite3.Error as e:
+                logger.error(f"清空结果缓存失败: {str(e)}")
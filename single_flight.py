@@ -0,0 +1,138 @@
+import errno
+import hashlib
+import os
+import threading
+import time
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows 等平台不支持跨进程文件锁
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# 锁文件中可用的字节位置数, 每个键按哈希占用其中一个字节加锁
+_LOCK_STRIPES = 1 << 31
+
+
+class SingleFlightTimeout(TimeoutError):
+    """等待同键请求结果超时"""
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """合并同一键的并发调用
+
+    同一进程内, 第一个调用者执行 fn, 其余调用者等待并共享其结果或异常.
+    指定 lock_dir 时, 执行者还会持有该键的跨进程锁, 使其他 worker 的执行者
+    排队等待, 从而在 fn 内部重新检查共享缓存时能直接拿到结果.
+    跨进程锁是目录下单个锁文件中按键哈希选定的一个字节的记录锁,
+    不会随键的增多产生新文件.
+    """
+
+    def __init__(self, lock_dir=None):
+        self.lock_dir = lock_dir if fcntl else None
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._fd = None
+        self._fd_pid = None
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+            self._lock_path = os.path.join(self.lock_dir, 'single_flight.lock')
+
+    def do(self, key, fn, timeout):
+        """执行或等待 fn(), 返回 (结果, 是否为共享结果)"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if not call.done.wait(timeout):
+                raise SingleFlightTimeout(f"等待 {key} 的解析结果超时")
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            with self._file_lock(key, timeout):
+                call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def _file_lock(self, key, timeout):
+        if not self.lock_dir:
+            return _NullLock()
+        offset = int(hashlib.sha1(repr(key).encode('utf-8')).hexdigest(), 16) % _LOCK_STRIPES
+        return _RangeLock(self._lock_fd(), offset, timeout)
+
+    def _lock_fd(self):
+        """当前进程的锁文件描述符
+
+        记录锁属于进程, 关闭该文件的任何描述符都会释放本进程在其上的全部锁,
+        因此每个进程只打开一次且不关闭; fork 后子进程重新打开.
+        """
+        with self._lock:
+            if self._fd_pid != os.getpid():
+                self._fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+                self._fd_pid = os.getpid()
+            return self._fd
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+class _NullLock:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _RangeLock:
+    """锁文件中单个字节的跨进程记录锁, 超时后不再等待而是直接执行"""
+
+    def __init__(self, fd, offset, timeout):
+        self.fd = fd
+        self.offset = offset
+        self.timeout = timeout
+        self.locked = False
+
+    def __enter__(self):
+        deadline = time.monotonic() + self.timeout
+        delay = 0.005
+        while True:
+            try:
+                fcntl.lockf(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, self.offset)
+                self.locked = True
+                return self
+            except OSError as e:
+                if e.errno not in (errno.EACCES, errno.EAGAIN):
+                    raise
+                if time.monotonic() >= deadline:
+                    logger.warning(f"等待锁文件第 {self.offset} 字节超时, 直接执行")
+                    return self
+                time.sleep(delay)
+                delay = min(delay * 2, 0.1)
+
+    def __exit__(self, *exc):
+        if self.locked:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN, 1, self.offset)
+            self.locked = False
+        return False
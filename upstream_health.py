@@ -0,0 +1,260 @@
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 熔断器状态
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS upstream_health (
+    api TEXT PRIMARY KEY,
+    ewma_latency REAL,
+    error_rate REAL NOT NULL DEFAULT 0,
+    failures INTEGER NOT NULL DEFAULT 0,
+    successes INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL DEFAULT 'closed',
+    opened_at REAL NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS probe_lease (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+"""
+
+
+class HealthBoard:
+    """解析接口健康记分板
+
+    后台线程定时探测各解析接口, 维护 EWMA 延迟、错误率和熔断状态.
+    状态保存在 sqlite 文件中, 同一台机器上的所有 gunicorn worker 共享,
+    通过租约保证同一时间只有一个 worker 在做探测.
+    """
+
+    def __init__(self, apis, probe, db_path=None, interval=30, alpha=0.3,
+                 failure_threshold=3, error_rate_threshold=0.6, cooldown=60,
+                 half_open_successes=2, snapshot_ttl=1.0):
+        self.apis = list(apis)
+        self.probe = probe
+        self.db_path = db_path or os.path.join(tempfile.gettempdir(), 'video_parser_health.db')
+        self.interval = interval
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.cooldown = cooldown
+        self.half_open_successes = half_open_successes
+        self.snapshot_ttl = snapshot_ttl
+        # 租约按接口列表区分, 不同应用可共用同一状态库
+        self.lease_name = hashlib.sha1('\n'.join(self.apis).encode('utf-8')).hexdigest()
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._snapshot = {}
+        self._snapshot_at = 0.0
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+        self._init_db()
+
+    def _connect(self):
+        """获取当前线程的数据库连接, fork 后自动重建"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_db(self):
+        try:
+            self._connect().executescript(_SCHEMA)
+        except sqlite3.Error as e:
+            logger.error(f"初始化健康状态库失败: {str(e)}")
+
+    def start(self):
+        """启动后台探测线程, 每个进程只启动一次"""
+        with self._lock:
+            if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='health-probe', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        owner = f"{os.getpid()}-{id(self)}"
+        while not self._stop.is_set():
+            try:
+                if self._acquire_lease(owner):
+                    self.probe_all()
+            except Exception as e:
+                logger.error(f"健康探测失败: {str(e)}")
+            self._stop.wait(self.interval)
+
+    def _acquire_lease(self, owner):
+        """抢占探测租约, 持有者或租约过期时才能成功"""
+        now = time.time()
+        conn = self._connect()
+        cursor = conn.execute(
+            'INSERT INTO probe_lease (name, owner, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires = excluded.expires '
+            'WHERE probe_lease.owner = excluded.owner OR probe_lease.expires < ?',
+            (self.lease_name, owner, now + self.interval * 2, now)
+        )
+        return cursor.rowcount > 0
+
+    def probe_all(self):
+        """探测所有接口; 熔断中的接口仅在冷却期结束后进行半开探测"""
+        snapshot = self.snapshot(force=True)
+        for api in self.apis:
+            if self._stop.is_set():
+                break
+            row = snapshot.get(api)
+            if row and row['state'] == OPEN and time.time() - row['opened_at'] < self.cooldown:
+                continue
+            start = time.monotonic()
+            try:
+                ok = bool(self.probe(api))
+            except Exception:
+                ok = False
+            self.record(api, ok, time.monotonic() - start)
+
+    def record(self, api, ok, latency):
+        """记录一次探测结果, 更新 EWMA 延迟、错误率和熔断状态"""
+        now = time.time()
+        try:
+            conn = self._connect()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute(
+                    'SELECT ewma_latency, error_rate, failures, successes, state, opened_at '
+                    'FROM upstream_health WHERE api = ?', (api,)
+                ).fetchone()
+                ewma, error_rate, failures, successes, state, opened_at = row or (None, 0.0, 0, 0, CLOSED, 0.0)
+                if state == OPEN and now - opened_at >= self.cooldown:
+                    state = HALF_OPEN
+                    successes = 0
+
+                error_rate = (1 - self.alpha) * error_rate + self.alpha * (0.0 if ok else 1.0)
+                if ok:
+                    ewma = latency if ewma is None else (1 - self.alpha) * ewma + self.alpha * latency
+                    failures = 0
+                    successes += 1
+                    if state == HALF_OPEN and successes >= self.half_open_successes:
+                        state = CLOSED
+                        logger.info(f"接口 {api} 恢复, 熔断关闭")
+                else:
+                    failures += 1
+                    successes = 0
+                    if state == HALF_OPEN or (state == CLOSED and (
+                            failures >= self.failure_threshold or error_rate >= self.error_rate_threshold)):
+                        if state != OPEN:
+                            logger.warning(f"接口 {api} 连续失败 {failures} 次, 熔断打开")
+                        state = OPEN
+                        opened_at = now
+
+                conn.execute(
+                    'INSERT OR REPLACE INTO upstream_health '
+                    '(api, ewma_latency, error_rate, failures, successes, state, opened_at, updated_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (api, ewma, error_rate, failures, successes, state, opened_at, now)
+                )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        except sqlite3.Error as e:
+            logger.error(f"记录接口 {api} 健康状态失败: {str(e)}")
+            return
+        with self._lock:
+            self._snapshot_at = 0.0
+
+    def snapshot(self, force=False):
+        """读取所有接口的健康状态, 进程内缓存 snapshot_ttl 秒"""
+        now = time.monotonic()
+        if not force and now - self._snapshot_at < self.snapshot_ttl:
+            return self._snapshot
+        try:
+            rows = self._connect().execute(
+                'SELECT api, ewma_latency, error_rate, failures, state, opened_at, updated_at '
+                'FROM upstream_health'
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"读取健康状态失败: {str(e)}")
+            return self._snapshot
+        snapshot = {}
+        wall = time.time()
+        for api, ewma, error_rate, failures, state, opened_at, updated_at in rows:
+            if state == OPEN and wall - opened_at >= self.cooldown:
+                state = HALF_OPEN
+            snapshot[api] = {
+                'ewma_latency': ewma,
+                'error_rate': error_rate,
+                'failures': failures,
+                'state': state,
+                'opened_at': opened_at,
+                'updated_at': updated_at
+            }
+        with self._lock:
+            self._snapshot = snapshot
+            self._snapshot_at = now
+        return snapshot
+
+    def ranked(self, apis=None):
+        """按健康状况排序接口
+
+        熔断关闭的接口按 EWMA 延迟升序在前, 尚无数据的接口保持原顺序紧随其后,
+        半开接口排在最后, 熔断打开的接口被剔除; 全部熔断时返回原顺序.
+        """
+        apis = list(apis or self.apis)
+        snapshot = self.snapshot()
+
+        def key(item):
+            index, api = item
+            row = snapshot.get(api)
+            if row is None:
+                return (1, 0, index)
+            if row['state'] == CLOSED:
+                latency = row['ewma_latency']
+                return (0 if latency is not None else 1, latency or 0, index)
+            return (2, 0, index)
+
+        usable = [item for item in enumerate(apis)
+                  if snapshot.get(item[1], {}).get('state') != OPEN]
+        if not usable:
+            return apis
+        return [api for _, api in sorted(usable, key=key)]
+
+    def is_open(self, api):
+        """接口熔断是否打开; 冷却期已过 (半开) 不算打开"""
+        row = self.snapshot().get(api)
+        return bool(row) and row['state'] == OPEN
+
+    def preferred(self, apis=None):
+        """返回可直接使用的最优接口, 无需再做实时探测
+
+        仅当排名第一的接口熔断关闭且最近 3 个探测周期内有成功记录时返回, 否则返回 None.
+        """
+        snapshot = self.snapshot()
+        for api in self.ranked(apis):
+            row = snapshot.get(api)
+            if (row and row['state'] == CLOSED and row['failures'] == 0
+                    and row['ewma_latency'] is not None
+                    and time.time() - row['updated_at'] < self.interval * 3):
+                return api
+            return None
+        return None
@@ -1,19 +1,28 @@
 import os
-from flask import Flask, request, jsonify, make_response, send_from_directory
+from flask import Flask, Response, g, request, jsonify, make_response, send_from_directory, stream_with_context
 from flask_cors import CORS
 import logging
-from logging.handlers import RotatingFileHandler
 import requests
 import re
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from upstream_health import HealthBoard
+from result_cache import ResultCache, MISS
+from platforms import PlatformRouter, canonical_key
+from single_flight import SingleFlight, SingleFlightTimeout
+from http_pool import SessionPool, AbortHandle
+from metrics import Registry, Gauge
+from async_logging import AsyncLogging
 
-# 配置日志
-logging.basicConfig(level=logging.INFO)
+# 配置日志: 请求线程只把日志放入队列, 由后台线程写控制台和日志文件
 logger = logging.getLogger(__name__)
-handler = RotatingFileHandler('app.log', maxBytes=10000, backupCount=1)
-handler.setFormatter(logging.Formatter(
-    '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-))
-logger.addHandler(handler)
+async_logging = AsyncLogging(
+    log_file=os.environ.get('LOG_FILE', 'app.log'),
+    max_bytes=int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024)),
+    backup_count=int(os.environ.get('LOG_BACKUP_COUNT', 5))
+).install()
 
 # 解析接口列表
 PARSE_APIS = [
@@ -25,6 +34,10 @@ PARSE_APIS = [
     'https://www.ckmov.vip/api.php?url='  # 备用线路5 - 超清接口
 ]
 
+# 可通过环境变量覆盖解析接口列表, 多个接口以逗号分隔
+if os.environ.get('PARSE_APIS'):
+    PARSE_APIS = [api.strip() for api in os.environ['PARSE_APIS'].split(',') if api.strip()]
+
 # 请求头
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
@@ -43,12 +56,168 @@ SUPPORTED_DOMAINS = [
     'kuaishou.com'
 ]
 
+# 各平台优先使用的解析接口, 如 {"bilibili": ["https://jx.xmflv.com/?url="]}
+PLATFORM_APIS = json.loads(os.environ.get('PLATFORM_APIS') or '{}')
+
+# 平台路由表, 按主机名识别视频平台
+platform_router = PlatformRouter(SUPPORTED_DOMAINS, apis=PLATFORM_APIS)
+
 class Config:
     """应用配置类"""
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-key-123'
     DEBUG = False
     PORT = int(os.environ.get('PORT', 5000))
     HOST = os.environ.get('HOST', '0.0.0.0')
+    # 接口探测模式: hedged 为并发竞速, sequential 为逐个尝试
+    PROBE_MODE = os.environ.get('PROBE_MODE', 'hedged')
+    # 单个接口探测超时(秒)
+    PROBE_TIMEOUT = float(os.environ.get('PROBE_TIMEOUT', 5))
+    # 相邻接口发起探测的间隔(秒), 0 表示同时发起
+    HEDGE_DELAY = float(os.environ.get('HEDGE_DELAY', 0.2))
+    # 单个解析请求同时在途且未超过 HEDGE_DELAY 的探测数上限, 挂起更久的探测不占名额
+    HEDGE_MAX_INFLIGHT = max(int(os.environ.get('HEDGE_MAX_INFLIGHT', 2)), 1)
+    # 单次解析请求的总截止时间(秒)
+    PARSE_DEADLINE = float(os.environ.get('PARSE_DEADLINE', 8))
+    # 探测线程池大小, 线路全部变慢时单个请求最多占用与线路数相同的探测线程, 线程按需创建
+    PROBE_WORKERS = int(os.environ.get('PROBE_WORKERS', 256))
+    # 是否启用后台健康探测
+    HEALTH_CHECK = os.environ.get('HEALTH_CHECK', '1') == '1'
+    # 健康状态库路径, 同机多个 worker 共享
+    HEALTH_DB_PATH = os.environ.get('HEALTH_DB_PATH')
+    # 后台健康探测周期(秒)
+    HEALTH_INTERVAL = float(os.environ.get('HEALTH_INTERVAL', 30))
+    # 健康探测使用的示例视频地址
+    HEALTH_PROBE_URL = os.environ.get('HEALTH_PROBE_URL', 'https://v.qq.com/')
+    # 熔断冷却时间(秒), 到期后进入半开状态
+    BREAKER_COOLDOWN = float(os.environ.get('BREAKER_COOLDOWN', 60))
+    # 解析结果缓存时长(秒)
+    RESULT_CACHE_TTL = float(os.environ.get('RESULT_CACHE_TTL', 600))
+    # 解析失败结果缓存时长(秒)
+    NEGATIVE_CACHE_TTL = float(os.environ.get('NEGATIVE_CACHE_TTL', 30))
+    # 进程内缓存条目数上限
+    RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', 10000))
+    # 进程内缓存内存上限(字节)
+    RESULT_CACHE_MAX_BYTES = int(os.environ.get('RESULT_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+    # 结果缓存文件路径, 设置后同机多个 worker 共享缓存
+    RESULT_CACHE_PATH = os.environ.get('RESULT_CACHE_PATH')
+    # 同一视频并发请求合并时, 等待首个请求结果的超时(秒)
+    SINGLE_FLIGHT_TIMEOUT = float(os.environ.get('SINGLE_FLIGHT_TIMEOUT', 10))
+    # 跨 worker 合并请求使用的锁文件目录, 需配合 RESULT_CACHE_PATH 使用
+    SINGLE_FLIGHT_LOCK_DIR = os.environ.get('SINGLE_FLIGHT_LOCK_DIR')
+    # 每个上游主机的 keep-alive 连接数上限
+    HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 10))
+    # 连接超时(秒), 读超时由 PROBE_TIMEOUT 决定
+    CONNECT_TIMEOUT = float(os.environ.get('CONNECT_TIMEOUT', 3.05))
+    # DNS 解析结果缓存时长(秒), 0 表示不缓存
+    DNS_CACHE_TTL = float(os.environ.get('DNS_CACHE_TTL', 60))
+    # 批量解析单次最多URL数
+    BATCH_MAX_URLS = int(os.environ.get('BATCH_MAX_URLS', 200))
+    # 单个批量请求同时解析的URL数
+    BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', 4))
+    # 批量解析线程池大小, 所有批量请求共用, 与单个解析请求隔离
+    BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', 8))
+    # 同时处理的批量请求数上限, 超出返回429
+    BATCH_MAX_ACTIVE = int(os.environ.get('BATCH_MAX_ACTIVE', 4))
+    # 多 worker 指标汇总文件, 每个部署单独一个, 重启后计数接续; 未设置时按进程统计, 每个 worker 需单独抓取
+    METRICS_DB_PATH = os.environ.get('METRICS_DB_PATH')
+
+# 上游 keep-alive 会话池, 按进程独立, fork 后自动重建
+http_pool = SessionPool(
+    pool_size=Config.HTTP_POOL_SIZE,
+    connect_timeout=Config.CONNECT_TIMEOUT,
+    read_timeout=Config.PROBE_TIMEOUT,
+    dns_ttl=Config.DNS_CACHE_TTL,
+    headers=HEADERS
+)
+
+# 探测线程池, 进程内所有请求共用
+_probe_executor = ThreadPoolExecutor(
+    max_workers=Config.PROBE_WORKERS,
+    thread_name_prefix='probe'
+)
+
+# 解析接口健康记分板, 同机多个 worker 共享
+health_board = HealthBoard(
+    PARSE_APIS,
+    probe=lambda api: health_probe(api),
+    db_path=Config.HEALTH_DB_PATH,
+    interval=Config.HEALTH_INTERVAL,
+    cooldown=Config.BREAKER_COOLDOWN
+)
+
+# 解析结果缓存
+result_cache = ResultCache(
+    maxsize=Config.RESULT_CACHE_SIZE,
+    max_bytes=Config.RESULT_CACHE_MAX_BYTES,
+    ttl=Config.RESULT_CACHE_TTL,
+    negative_ttl=Config.NEGATIVE_CACHE_TTL,
+    path=Config.RESULT_CACHE_PATH
+)
+
+# 批量解析线程池和并发批量请求名额
+_batch_executor = ThreadPoolExecutor(
+    max_workers=Config.BATCH_WORKERS,
+    thread_name_prefix='batch'
+)
+# 批量解析专用的探测线程池, 批量请求不占用单个解析请求的探测线程
+_batch_probe_executor = ThreadPoolExecutor(
+    max_workers=Config.BATCH_WORKERS * len(PARSE_APIS),
+    thread_name_prefix='batch-probe'
+)
+_batch_slots = threading.BoundedSemaphore(Config.BATCH_MAX_ACTIVE)
+
+# 同一视频的并发解析请求合并
+single_flight = SingleFlight(
+    lock_dir=Config.SINGLE_FLIGHT_LOCK_DIR if Config.RESULT_CACHE_PATH else None
+)
+
+# 运行指标, 通过 /metrics 以 Prometheus 文本格式输出, 设置 METRICS_DB_PATH 时汇总所有 worker
+metrics = Registry(path=Config.METRICS_DB_PATH)
+REQUEST_LATENCY = metrics.histogram(
+    'parse_request_duration_seconds', '请求处理耗时(秒)', ('route', 'method', 'status'))
+REQUESTS_IN_FLIGHT = metrics.gauge(
+    'parse_requests_in_flight', '正在处理的请求数', ('route',))
+PROBE_LATENCY = metrics.histogram(
+    'upstream_probe_duration_seconds', '解析接口探测耗时(秒)', ('api', 'result', 'source'))
+CACHE_RESULTS = metrics.counter(
+    'parse_cache_results_total', '解析结果缓存命中情况', ('status',))
+
+# /metrics 输出的连接池统计来源, ASGI 模式通过 set_pool_stats 改为异步客户端的统计
+_pool_stats = http_pool.stats
+
+def set_pool_stats(source):
+    global _pool_stats
+    _pool_stats = source
+
+# 熔断状态取值
+CIRCUIT_STATES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+@metrics.collect
+def upstream_metrics():
+    """抓取时从健康记分板和连接池读取上游状态"""
+    latency = Gauge('upstream_ewma_latency_seconds', '解析接口 EWMA 延迟(秒)', ('api',))
+    success = Gauge('upstream_success_rate', '解析接口 EWMA 成功率', ('api',))
+    circuit = Gauge('upstream_circuit_state', '解析接口熔断状态: 0 关闭, 1 半开, 2 打开', ('api',))
+    for api, row in health_board.snapshot().items():
+        if api not in health_board.apis:
+            continue
+        if row['ewma_latency'] is not None:
+            latency.set(row['ewma_latency'], api=api)
+        success.set(1 - row['error_rate'], api=api)
+        circuit.set(CIRCUIT_STATES.get(row['state'], 0), api=api)
+    pool = Gauge('upstream_pool_events', '连接池累计事件数', ('event',))
+    for event, value in _pool_stats().items():
+        pool.set(value, event=event)
+    return [latency, success, circuit, pool]
+
+def timing_mark(name):
+    """记录自上一个标记以来的耗时, 随 Server-Timing 响应头返回"""
+    now = time.perf_counter()
+    g.timings.append((name, now - g.timing_last))
+    g.timing_last = now
+
+def format_server_timing(timings):
+    return ', '.join(f'{name};dur={elapsed * 1000:.3f}' for name, elapsed in timings)
 
 def create_app():
     """创建Flask应用"""
@@ -58,6 +227,27 @@ def create_app():
     # 配置CORS
     CORS(app)
     
+    # 请求计时和在途请求统计
+    @app.before_request
+    def start_request():
+        g.request_start = g.timing_last = time.perf_counter()
+        g.timings = []
+        g.route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUESTS_IN_FLIGHT.inc(route=g.route)
+
+    @app.after_request
+    def finish_request(response):
+        if 'request_start' in g:
+            elapsed = time.perf_counter() - g.request_start
+            REQUEST_LATENCY.observe(elapsed, route=g.route, method=request.method, status=response.status_code)
+            response.headers['Server-Timing'] = format_server_timing(g.timings + [('total', elapsed)])
+        return response
+
+    @app.teardown_request
+    def end_request(error=None):
+        if 'route' in g:
+            REQUESTS_IN_FLIGHT.dec(route=g.route)
+
     # 注册路由
     @app.route('/')
     def serve_index():
@@ -84,50 +274,86 @@ def create_app():
                 return jsonify({'error': '请提供视频URL'}), 400
 
             # 检查URL格式
-            if not is_valid_url(url):
+            platform = match_platform(url)
+            if not platform:
                 return jsonify({'error': '不支持的视频平台或无效的URL'}), 400
+            timing_mark('validate')
+
+            result, cache_status = resolve_video(url, platform)
+            timing_mark('probe')
+            if result:
+                # 返回解析结果
+                response = jsonify(dict(result, cache=cache_status))
+
+                response.headers.update({
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                    'Access-Control-Allow-Headers': 'Content-Type',
+                    'Cache-Control': 'no-cache'
+                })
+                timing_mark('serialize')
+                return response
 
-            # 尝试使用不同的解析接口
-            for api in PARSE_APIS:
-                try:
-                    parse_url = api + url
-                    logger.info(f"尝试使用接口: {api}")
-                    
-                    # 验证解析接口是否可用
-                    try:
-                        response = requests.head(parse_url, headers=HEADERS, timeout=5, allow_redirects=True)
-                        if response.status_code != 200:
-                            logger.warning(f"接口 {api} 返回状态码: {response.status_code}")
-                            continue
-                    except requests.RequestException as e:
-                        logger.error(f"请求接口 {api} 失败: {str(e)}")
-                        continue
-                    
-                    # 返回解析结果
-                    response = jsonify({
-                        'url': parse_url,
-                        'title': '视频播放',
-                        'api': api
-                    })
-                    
-                    response.headers.update({
-                        'Access-Control-Allow-Origin': '*',
-                        'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                        'Access-Control-Allow-Headers': 'Content-Type',
-                        'Cache-Control': 'no-cache'
-                    })
-                    return response
-                    
-                except Exception as e:
-                    logger.error(f"解析接口 {api} 失败: {str(e)}")
-                    continue
-            
-            return jsonify({'error': '视频解析失败，请稍后重试'}), 400
+            return jsonify({'error': '视频解析失败，请稍后重试', 'cache': cache_status}), 400
+
+        except SingleFlightTimeout as e:
+            logger.warning(f"解析超时: {str(e)}")
+            return jsonify({'error': '解析超时，请稍后重试'}), 504
                 
         except Exception as e:
             logger.error(f"解析错误: {str(e)}")
             return jsonify({'error': '服务器处理请求失败，请稍后重试'}), 500
 
+    @app.route('/parse/batch', methods=['POST', 'OPTIONS'])
+    def parse_batch():
+        if request.method == 'OPTIONS':
+            response = make_response()
+            response.headers.update({
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type'
+            })
+            return response
+
+        data = request.get_json(silent=True)
+        urls = data.get('urls') if isinstance(data, dict) else None
+        if not urls or not isinstance(urls, list):
+            return jsonify({'error': '请提供视频URL列表'}), 400
+        if len(urls) > Config.BATCH_MAX_URLS:
+            return jsonify({'error': f'单次最多解析 {Config.BATCH_MAX_URLS} 个URL'}), 400
+
+        # 先校验全部URL, 任何一个无效则整批拒绝
+        invalid = [i for i, url in enumerate(urls)
+                   if not isinstance(url, str) or not url.strip() or not is_valid_url(url)]
+        if invalid:
+            return jsonify({'error': '不支持的视频平台或无效的URL', 'invalid': invalid}), 400
+
+        if not _batch_slots.acquire(blocking=False):
+            return jsonify({'error': '批量解析繁忙，请稍后重试'}), 429
+
+        def generate():
+            for record in resolve_batch([url.strip() for url in urls], Config.BATCH_CONCURRENCY):
+                yield json.dumps(record, ensure_ascii=False) + '\n'
+
+        response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        response.call_on_close(_batch_slots.release)
+        response.headers.update({
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': 'POST, OPTIONS',
+            'Access-Control-Allow-Headers': 'Content-Type',
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+        return response
+
+    @app.route('/stats')
+    def stats():
+        return jsonify({'pool': http_pool.stats()})
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        return Response(metrics.render(), content_type=Registry.CONTENT_TYPE)
+
     @app.errorhandler(404)
     def not_found_error(error):
         return jsonify({'error': '请求的资源不存在'}), 404
@@ -140,7 +366,264 @@ def create_app():
 
 def is_valid_url(url):
     """检查URL是否为支持的视频平台"""
-    return any(domain in url.lower() for domain in SUPPORTED_DOMAINS)
+    return match_platform(url) is not None
+
+def match_platform(url):
+    """返回URL所属的平台记录, 不支持时返回 None"""
+    return platform_router.match(url)
+
+def resolve_video(url, platform=None, probe_executor=None):
+    """解析视频地址, 返回 (解析结果, 缓存状态); 所有接口均不可用时结果为 None
+
+    probe_executor 为竞速探测使用的线程池, 默认为单个解析请求共用的探测线程池.
+    """
+    platform = platform or match_platform(url)
+    key = canonical_key(url, platform)
+    cached = cached_result(key)
+    if cached is not MISS:
+        CACHE_RESULTS.inc(status='hit')
+        return for_request(cached, url), 'hit'
+
+    # 同一视频的并发请求只由第一个请求实际解析, 其余等待共享结果
+    (result, cache_status), shared = single_flight.do(
+        key, lambda: _resolve_uncached(url, key, platform, probe_executor), Config.SINGLE_FLIGHT_TIMEOUT
+    )
+    cache_status = 'coalesced' if shared else cache_status
+    CACHE_RESULTS.inc(status=cache_status)
+    return for_request(result, url), cache_status
+
+def _resolve_uncached(url, key, platform, probe_executor=None):
+    """探测解析接口并写入缓存; 获得跨进程锁后先检查其他 worker 是否已写入结果"""
+    if single_flight.lock_dir:
+        cached = cached_result(key)
+        if cached is not MISS:
+            return cached, 'hit'
+
+    # 优先使用记分板中健康的接口, 否则按健康排名实时探测
+    api = preferred_api(platform)
+    if not api:
+        apis = ranked_apis(platform)
+        if Config.PROBE_MODE == 'sequential':
+            api = sequential_probe(url, apis, Config.PARSE_DEADLINE)
+        else:
+            api = hedged_probe(url, apis, Config.HEDGE_DELAY, Config.PARSE_DEADLINE, executor=probe_executor)
+
+    result = build_result(url, api, platform)
+    result_cache.set(key, result)
+    return result, 'miss'
+
+def cached_result(key):
+    """读取缓存结果, 结果使用的接口已被记分板熔断时按未命中处理, 重新选择线路"""
+    cached = result_cache.get(key)
+    if cached is not MISS and cached and line_open(cached):
+        return MISS
+    return cached
+
+def line_open(result):
+    """解析结果使用的接口当前是否处于熔断状态"""
+    return health_board.is_open(result['api'])
+
+def build_result(url, api, platform):
+    """生成解析结果, 没有可用接口时返回 None"""
+    if not api:
+        return None
+    return {
+        'url': api + url,
+        'title': '视频播放',
+        'api': api,
+        'platform': platform.name if platform else 'other'
+    }
+
+def for_request(result, url):
+    """缓存或合并得到的结果可能来自同一视频的其他链接, 播放地址按本次请求的链接重新生成"""
+    if not result:
+        return result
+    return dict(result, url=result['api'] + url)
+
+def preferred_api(platform=None):
+    """启用后台健康探测时, 返回记分板中无需实时探测即可使用的接口, 平台优先接口排在前面"""
+    if not Config.HEALTH_CHECK:
+        return None
+    health_board.start()
+    if platform and platform.apis:
+        api = health_board.preferred(platform.apis)
+        if api:
+            return api
+    return health_board.preferred()
+
+def ranked_apis(platform=None):
+    """按健康排名排序的接口列表, 平台优先接口排在前面"""
+    apis = health_board.ranked()
+    if platform and platform.apis:
+        preferred = [api for api in apis if api in platform.apis]
+        apis = preferred + [api for api in apis if api not in preferred]
+    return apis
+
+def resolve_batch(urls, concurrency):
+    """并发解析多个URL, 按完成先后逐条产出结果记录
+
+    每批最多同时解析 concurrency 个URL, 上一条完成后才提交下一条,
+    客户端读取缓慢时不会继续占用解析线程.
+    """
+    pending = set()
+    remaining = iter(enumerate(urls))
+
+    def fill():
+        while len(pending) < concurrency:
+            item = next(remaining, None)
+            if item is None:
+                return
+            pending.add(_batch_executor.submit(_batch_record, *item))
+
+    try:
+        fill()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.discard(future)
+                yield future.result()
+            fill()
+    finally:
+        for future in pending:
+            future.cancel()
+
+def _batch_record(index, url):
+    """解析单个URL并生成批量结果记录, 失败时记录错误信息"""
+    try:
+        result, cache_status = resolve_video(url, probe_executor=_batch_probe_executor)
+    except SingleFlightTimeout:
+        return {'index': index, 'input': url, 'error': '解析超时，请稍后重试'}
+    except Exception as e:
+        logger.error(f"批量解析 {url} 失败: {str(e)}")
+        return {'index': index, 'input': url, 'error': '服务器处理请求失败，请稍后重试'}
+    if not result:
+        return {'index': index, 'input': url, 'error': '视频解析失败，请稍后重试', 'cache': cache_status}
+    return dict(result, index=index, input=url, cache=cache_status)
+
+# 探测结果: 可用 / 接口返回非200 / 超时或连接失败 / 被中断
+PROBE_OK = 'ok'
+PROBE_REJECTED = 'rejected'
+PROBE_FAILED = 'failed'
+PROBE_ABORTED = 'aborted'
+
+def probe_api(api, url, timeout, abort=None):
+    """探测单个解析接口, 返回探测结果; abort 为 AbortHandle 时可被其他线程中断"""
+    logger.info(f"尝试使用接口: {api}")
+    try:
+        response = http_pool.head(api + url, timeout=timeout, abort=abort, allow_redirects=True)
+    except requests.RequestException as e:
+        if abort is not None and abort.aborted:
+            return PROBE_ABORTED
+        logger.error(f"请求接口 {api} 失败: {str(e)}")
+        return PROBE_FAILED
+    if response.status_code != 200:
+        logger.warning(f"接口 {api} 返回状态码: {response.status_code}")
+        return PROBE_REJECTED
+    return PROBE_OK
+
+def breaker_verdict(outcome, timeout):
+    """请求路径上的探测结果如何计入熔断器: True 成功, False 失败, None 不计入
+
+    非200可能只针对这一个视频, 超时时间被 PARSE_DEADLINE 截短的探测也不能说明
+    接口不可用, 两者都不计入; 只有用满 PROBE_TIMEOUT 仍超时或连接失败才计为失败.
+    """
+    if outcome == PROBE_OK:
+        return True
+    if outcome == PROBE_FAILED and timeout >= Config.PROBE_TIMEOUT:
+        return False
+    return None
+
+def recorded_probe(api, url, timeout, abort=None):
+    """探测接口并按 breaker_verdict 把结果计入健康记分板"""
+    start = time.monotonic()
+    outcome = probe_api(api, url, timeout, abort)
+    if outcome == PROBE_ABORTED:
+        return False
+    elapsed = time.monotonic() - start
+    ok = outcome == PROBE_OK
+    PROBE_LATENCY.observe(elapsed, api=api, result='ok' if ok else 'fail', source='request')
+    verdict = breaker_verdict(outcome, timeout)
+    if verdict is not None:
+        health_board.record(api, verdict, elapsed)
+    return ok
+
+def health_probe(api):
+    """后台健康探测使用的探测函数"""
+    start = time.monotonic()
+    ok = probe_api(api, Config.HEALTH_PROBE_URL, Config.PROBE_TIMEOUT) == PROBE_OK
+    PROBE_LATENCY.observe(time.monotonic() - start, api=api, result='ok' if ok else 'fail', source='health')
+    return ok
+
+def sequential_probe(url, apis, deadline):
+    """按顺序逐个探测解析接口, 返回第一个可用的接口"""
+    start = time.monotonic()
+    for api in apis:
+        remaining = deadline - (time.monotonic() - start)
+        if remaining <= 0:
+            logger.warning(f"解析超时, 已用时 {deadline} 秒")
+            break
+        if recorded_probe(api, url, min(Config.PROBE_TIMEOUT, remaining)):
+            return api
+    return None
+
+def next_hedge_at(next_at, started, now, hedge_delay, max_inflight):
+    """下一个探测的发起时间: 错峰时间到达, 且发起不到 hedge_delay 秒的探测少于 max_inflight 个"""
+    fresh = sorted(t for t in started if now - t < hedge_delay)
+    if len(fresh) < max_inflight:
+        return next_at
+    return max(next_at, fresh[len(fresh) - max_inflight] + hedge_delay)
+
+def hedged_probe(url, apis, hedge_delay, deadline, max_inflight=None, executor=None):
+    """并发探测解析接口, 返回最先可用的接口
+
+    错峰在请求线程中完成: 先探测第一个接口, 此后每过 hedge_delay 秒仍没有
+    可用接口, 或有探测失败, 才发起下一个. 发起不到 hedge_delay 秒的探测不超过
+    max_inflight 个, 挂起更久的探测不再占用名额, 前几条线路无响应时不会卡住后面的线路.
+    一旦有接口返回200, 立即中断其余在途探测, 释放探测线程.
+    整个过程不超过 deadline 秒, 全部失败或超时返回 None.
+    探测在 executor 中执行, 默认为 _probe_executor.
+    """
+    max_inflight = max_inflight or Config.HEDGE_MAX_INFLIGHT
+    executor = executor or _probe_executor
+    start = time.monotonic()
+    queue = iter(apis)
+    pending = {}
+    exhausted = False
+    next_at = start
+    try:
+        while True:
+            now = time.monotonic()
+            remaining = deadline - (now - start)
+            if remaining <= 0:
+                logger.warning(f"解析超时, 已用时 {deadline} 秒")
+                return None
+            launch_at = next_hedge_at(next_at, [started for _, _, started in pending.values()],
+                                     now, hedge_delay, max_inflight)
+            if not exhausted and now >= launch_at:
+                api = next(queue, None)
+                if api is None:
+                    exhausted = True
+                else:
+                    abort = AbortHandle()
+                    future = executor.submit(
+                        recorded_probe, api, url, min(Config.PROBE_TIMEOUT, remaining), abort)
+                    pending[future] = (api, abort, now)
+                    next_at = now + hedge_delay
+                continue
+            if not pending:
+                return None
+            timeout = remaining if exhausted else min(remaining, launch_at - now)
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                api, _, _ = pending.pop(future)
+                if future.result():
+                    return api
+                # 探测失败, 不再等待错峰间隔
+                next_at = time.monotonic()
+    finally:
+        for future, (_, abort, _) in pending.items():
+            future.cancel()
+            abort.abort()
 
 if __name__ == '__main__':
     app = create_app()